@@ -1,1146 +1,1515 @@
-"""
-Main application module for 2WATCH Flask app.
-
-This module defines the Flask app, configures login/session management,
-sets up database connections, and registers all routes for:
-- Home page and API endpoints (search, popular, now_playing, discover, genres, upcoming)
-- User authentication (register, login, logout)
-- Watchlist and ranking features
-- Profile and title details pages
-- Helper functions for TMDb API integration
-"""
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, flash
-import requests # HTTP requests to external APIs (TMDb, YouTube)
-import sqlite3  # SQLite database connection
-import os       # Operating system utilities (paths, env)
-import random   # Random choice for YouTube videos
-from tmdb import search_title, get_title_details, get_episodes_for_tv_show
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-from dotenv import load_dotenv # Load environment variables from .env
-
-# Load environment variables (TMDB and YouTube API keys)
-load_dotenv()
-
-app = Flask(__name__)
-
-# Configure Flask-Login
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"
-
-# Secret key for session signing
-app.secret_key = os.getenv("SECRET_KEY")
-
-# API Keys
-API_KEY = os.getenv("TMDB_API_KEY")
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-
-# YouTube Channel IDs for video fetching
-CHANNEL_IDS = [
-    "UCzuqhhs6NWbgTzMuM09WKDQ",  # MOVIECLIPS
-    "UC5nG0U7W_4XEBrr2PzZRYWg"   # BoxofficeMoviesScenes
-]
-
-# SQLite database file path
-DATABASE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "database.db")
-
-# User model and loader
-class User(UserMixin):
-    """
-    Simple User class for Flask-Login.
-    Holds id, username, and avatar filename.
-    """
-    def __init__(self, id, username, avatar):
-        self.id = id
-        self.username = username
-        self.avatar = avatar
-
-@login_manager.user_loader
-def load_user(user_id):
-    """
-    Given a user ID, fetch user record from the database
-    and return a User object or None if not found.
-    """
-    db = get_db()
-    user = db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-    if user:
-        return User(id=user["id"], username=user["username"], avatar=user["avatar"])
-    return None
-
-# Database connection handling
-def get_db():
-    """
-    Returns a SQLite connection stored in flask.g for reuse.
-    Ensures row_factory is sqlite3.Row for named columns.
-    """
-    if "db" not in g:
-        g.db = sqlite3.connect(DATABASE)
-        g.db.row_factory = sqlite3.Row
-    return g.db
-
-@app.teardown_appcontext
-def close_db(exception):
-    """
-    Closes the database connection at the end of request.
-    """
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
-
-# Home
-@app.route("/")
-def index():
-    """
-    Render the home page template.
-    Contains main UI with carousels for popular, now playing, etc.
-    """
-    return render_template("home.html")
-
-# API endpoint: Fetch titles for a given user and status
-@app.route("/api/user_titles")
-@login_required
-def get_user_titles():
-    """
-    Return a JSON list of titles filtered by user-specific status.
-    Query param 'status' must be one of: WATCHED, WATCHLIST, NOT_INTERESTED.
-    """
-    status = request.args.get("status", "").upper()
-    if not status:
-        return jsonify([])
-
-    db = get_db()
-    rows = db.execute("""
-        SELECT tmdb_id, media_type
-        FROM user_ratings
-        WHERE user_id = ? AND rank = ?
-    """, (current_user.id, status)).fetchall()
-
-    results = []
-    # For each rating record, fetch fresh details from TMDb
-    for row in rows:
-        tmdb_id = row["tmdb_id"]
-        media_type = row["media_type"]
-
-        tmdb_url = f"https://api.themoviedb.org/3/{'tv' if media_type == 'show' else 'movie'}/{tmdb_id}"
-        params = { "api_key": API_KEY, "language": "en-US" }
-        response = requests.get(tmdb_url, params=params)
-
-        if response.status_code == 200:
-            data = response.json()
-            # Build a consistent result object
-            results.append({
-                "tmdb_id": tmdb_id,
-                "media_type": media_type,
-                "name": data.get("title") or data.get("name"),
-                "poster_url": f"https://image.tmdb.org/t/p/w200{data['poster_path']}" if data.get("poster_path") else "/static/images/placeholder.png"
-            })
-
-    return jsonify(results)
-
-# Home - Popular Now Row (API Endpoint: TMDb Data)
-@app.route("/api/tmdb/popular")
-def get_popular_movies():
-    """
-    Return JSON of popular movies from TMDb, page 1.
-    If user is logged in, include their saved status per title.
-    """
-    try:
-        url = "https://api.themoviedb.org/3/movie/popular"
-        params = {
-            "api_key": API_KEY,
-            "language": "en-US",
-            "page": 1
-        }
-
-        response = requests.get(url, params=params)
-        data = response.json()
-
-        results = []
-        user_status_map = {}
-
-        # Map user's existing ranks if any
-        if current_user.is_authenticated:
-            db = get_db()
-            user_id = current_user.id
-
-            query = db.execute("""
-                SELECT tmdb_id, media_type, rank
-                FROM user_ratings
-                WHERE user_id = ?
-            """, (user_id,)).fetchall()
-
-            for row in query:
-                key = f"{row['media_type']}_{row['tmdb_id']}"
-                user_status_map[key] = row["rank"]
-
-        # Build response list
-        for item in data.get("results", []):
-            tmdb_id = item["id"]
-            media_type = "movie"
-            key = f"{media_type}_{tmdb_id}"
-            user_rank = user_status_map.get(key)
-
-            results.append({
-                "tmdb_id": tmdb_id,
-                "name": item.get("title"),
-                "media_type": media_type,
-                "poster_url": f"https://image.tmdb.org/t/p/w500{item.get('poster_path')}" if item.get("poster_path") else "/static/images/placeholder.png",
-                "user_status": user_rank
-            })
-
-        return jsonify(results)
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# Home - Now Playing in Theaters Row (API Endpoint: TMDb Data)
-@app.route("/api/tmdb/now_playing")
-def get_now_playing_movies():
-    """
-    Return JSON of now-playing movies in US region.
-    Similar to popular, includes user status if logged in.
-    """
-    try:
-        url = "https://api.themoviedb.org/3/movie/now_playing"
-        params = {
-            "api_key": API_KEY,
-            "language": "en-US",
-            "page": 1,
-            "region": "US"
-        }
-
-        response = requests.get(url, params=params)
-        data = response.json()
-
-        # ... identical logic as get_popular_movies ...
-        # Return JSON list
-
-        results = []
-        user_status_map = {}
-
-        if current_user.is_authenticated:
-            db = get_db()
-            user_id = current_user.id
-
-            query = db.execute("""
-                SELECT tmdb_id, media_type, rank
-                FROM user_ratings
-                WHERE user_id = ?
-            """, (user_id,)).fetchall()
-
-            for row in query:
-                key = f"{row['media_type']}_{row['tmdb_id']}"
-                user_status_map[key] = row["rank"]
-
-        for item in data.get("results", []):
-            tmdb_id = item["id"]
-            media_type = "movie"
-            key = f"{media_type}_{tmdb_id}"
-            user_rank = user_status_map.get(key)
-
-            results.append({
-                "tmdb_id": tmdb_id,
-                "name": item.get("title"),
-                "media_type": media_type,
-                "poster_url": f"https://image.tmdb.org/t/p/w500{item.get('poster_path')}" if item.get("poster_path") else "/static/images/placeholder.png",
-                "user_status": user_rank
-            })
-
-        return jsonify(results)
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# Home - Discover Titles Row (API Endpoint: TMDb Data)
-@app.route("/api/tmdb/discover")
-def discover_titles():
-    """
-    Return JSON of discovered movies or TV based on genre filters.
-    Query params: with_genres, media_type.
-    """
-    try:
-        genres = request.args.get("with_genres", "")
-        media_type = request.args.get("media_type", "movie")
-
-        url = f"https://api.themoviedb.org/3/discover/{media_type}"
-        params = {
-            "api_key": API_KEY,
-            "language": "en-US",
-            "sort_by": "popularity.desc",
-            "with_genres": genres,
-            "page": 1
-        }
-
-        response = requests.get(url, params=params)
-        data = response.json()
-
-        results = []
-        user_status_map = {}
-
-        if current_user.is_authenticated:
-            db = get_db()
-            user_id = current_user.id
-
-            query = db.execute("""
-                SELECT tmdb_id, media_type, rank
-                FROM user_ratings
-                WHERE user_id = ?
-            """, (user_id,)).fetchall()
-
-            for row in query:
-                key = f"{row['media_type']}_{row['tmdb_id']}"
-                user_status_map[key] = row["rank"]
-
-        for item in data.get("results", []):
-            tmdb_id = item["id"]
-            title = item.get("title") or item.get("name")
-            key = f"{media_type}_{tmdb_id}"
-            user_rank = user_status_map.get(key)
-
-            results.append({
-                "tmdb_id": tmdb_id,
-                "name": title,
-                "media_type": media_type,
-                "poster_url": f"https://image.tmdb.org/t/p/w500{item.get('poster_path')}" if item.get("poster_path") else "/static/images/placeholder.png",
-                "user_status": user_rank
-            })
-
-        return jsonify(results)
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# Home - API for genres filter list (API Endpoint: TMDb Data)
-@app.route("/api/genres")
-def get_genres():
-    """
-    Return JSON of all TMDb genres for movie and TV.
-    Used to populate filter checkboxes.
-    """
-    try:
-        genres = {}
-        for media_type in ["movie", "tv"]:
-            url = f"https://api.themoviedb.org/3/genre/{media_type}/list"
-            params = {
-                "api_key": API_KEY,
-                "language": "en-US"
-            }
-            response = requests.get(url, params=params)
-            data = response.json()
-            genres[media_type] = data.get("genres", [])
-
-        return jsonify(genres)
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
-# Home - Upcoming Titles Carousel (API Endpoint: TMDb Data)
-@app.route("/api/tmdb/upcoming")
-def tmdb_upcoming():
-    """
-    Return JSON of upcoming movies and on-the-air TV (first 6 each).
-    Used to build the homepage carousel.
-    """
-    try:
-        combined_results = []
-
-        # --- MOVIES ---
-        movie_url = "https://api.themoviedb.org/3/movie/upcoming"
-        movie_params = {
-            "api_key": API_KEY,
-            "language": "en-US",
-            "page": 1,
-            "region": "US"
-        }
-        movie_response = requests.get(movie_url, params=movie_params)
-        movie_data = movie_response.json().get("results", [])[:8]
-
-        for movie in movie_data:
-            combined_results.append({
-                "tmdb_id": movie.get("id"),
-                "name": movie.get("title"),
-                "media_type": "movie",
-                "poster_url": f"https://image.tmdb.org/t/p/w500{movie.get('poster_path')}" if movie.get("poster_path") else None,
-                "backdrop_url": f"https://image.tmdb.org/t/p/original{movie.get('backdrop_path')}" if movie.get("backdrop_path") else None,
-                "year": movie.get("release_date", "")[:4]
-            })
-
-        # --- TV SHOWS ---
-        tv_url = "https://api.themoviedb.org/3/tv/on_the_air"
-        tv_params = {
-            "api_key": API_KEY,
-            "language": "en-US",
-            "page": 1
-        }
-        tv_response = requests.get(tv_url, params=tv_params)
-        tv_data = tv_response.json().get("results", [])[:8]
-
-        for show in tv_data:
-            combined_results.append({
-                "tmdb_id": show.get("id"),
-                "name": show.get("name"),
-                "media_type": "tv",
-                "poster_url": f"https://image.tmdb.org/t/p/w500{show.get('poster_path')}" if show.get("poster_path") else None,
-                "backdrop_url": f"https://image.tmdb.org/t/p/original{show.get('backdrop_path')}" if show.get("backdrop_path") else None,
-                "year": show.get("first_air_date", "")[:4]
-            })
-
-        return jsonify(combined_results)
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# Registration
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    db = get_db()
-
-    avatar_folder = os.path.join(app.static_folder, "images", "avatars")
-    avatars = sorted([f for f in os.listdir(avatar_folder)])
-
-    if request.method == "POST":
-        username = request.form.get("username")
-        password = request.form.get("password")
-        confirmation = request.form.get("confirmation")
-        avatar = request.form.get("avatar") or "avatar_default.png"
-
-        if not username or not password or not confirmation:
-            flash("Please fill out all fields.", "error")
-            return redirect("/register")
-
-        if password != confirmation:
-            flash("Passwords do not match.", "error")
-            return redirect("/register")
-
-        # Password hashing
-        hashed = generate_password_hash(password)
-
-        try:
-            db.execute(
-                "INSERT INTO users (username, password, avatar) VALUES (?, ?, ?)",
-                (username, hashed, avatar)
-            )
-            db.commit()
-        except sqlite3.IntegrityError:
-            flash("Username already exists.", "error")
-            return redirect("/register")
-
-        flash("Account created successfully!", "success")
-        return redirect("/login")
-
-    return render_template("register.html", avatars=avatars)
-
-# Login
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "POST":
-        username = request.form.get("username")
-        password = request.form.get("password")
-
-        db = get_db()
-        user = db.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
-
-        if user is None or not check_password_hash(user["password"], password):
-            flash("Invalid username or password.", "error")
-            return redirect(url_for("login"))
-
-        login_user(User(user["id"], user["username"], user["avatar"]), remember=True)
-        flash("Login successful!", "success")
-        return redirect(url_for("index"))
-
-    return render_template("login.html")
-
-# Logout
-@app.route("/logout")
-@login_required
-def logout():
-    logout_user()
-    flash("You have been logged out.", "success")
-    return redirect(url_for("login"))
-
-# Helper function
-def get_genre_ids(selected_names):
-    """
-    Convert list of genre names to TMDb genre IDs using a cached lookup.
-    """
-    global _genre_cache
-    if _genre_cache is None:
-        _genre_cache = {}
-        for media in ("movie", "tv"):
-            url = f"https://api.themoviedb.org/3/genre/{media}/list"
-            resp = requests.get(url, params={
-                "api_key": API_KEY,
-                "language": "en-US"
-            })
-            for g in resp.json().get("genres", []):
-                _genre_cache[g["name"]] = g["id"]
-
-    return [_genre_cache[name] for name in selected_names if name in _genre_cache]
-
-# Menu Mobile
-@app.route("/menu-mobile")
-def menu_mobile():
-    return render_template("menu_mobile.html")
-
-# Settings Page
-@app.route("/settings", methods=["GET", "POST"])
-@login_required
-def settings():
-    db = get_db()
-    user_id = current_user.id
-
-    if request.method == "POST":
-        form_type = request.form.get("form_type")
-
-        # Change Username
-        if form_type == "change_username":
-            new_username = request.form.get("new_username")
-            if not new_username:
-                flash("Username cannot be empty.", "error")
-            else:
-                try:
-                    db.execute("UPDATE users SET username = ? WHERE id = ?", (new_username, user_id))
-                    db.commit()
-                    current_user.username = new_username
-                    flash("Username updated successfully.", "success")
-                except sqlite3.IntegrityError:
-                    flash("Username already exists.", "error")
-
-        # Change Password
-        elif form_type == "change_password":
-            current = request.form.get("current_password")
-            new = request.form.get("new_password")
-            confirm = request.form.get("confirm_password")
-
-            row = db.execute("SELECT password FROM users WHERE id = ?", (user_id,)).fetchone()
-            if not check_password_hash(row["password"], current):
-                flash("Current password is incorrect.", "error")
-            elif new != confirm:
-                flash("New passwords do not match.", "error")
-            else:
-                db.execute("UPDATE users SET password = ? WHERE id = ?", (generate_password_hash(new), user_id))
-                db.commit()
-                flash("Password updated successfully.", "success")
-
-        # Change Avatar
-        elif form_type == "change_avatar":
-            new_avatar = request.form.get("avatar")
-            if new_avatar:
-                db.execute("UPDATE users SET avatar = ? WHERE id = ?", (new_avatar, user_id))
-                db.commit()
-                current_user.avatar = new_avatar
-                flash("Avatar updated!", "success")
-
-        # Delete Account
-        elif form_type == "delete_account":
-            db.execute("DELETE FROM users WHERE id = ?", (user_id,))
-            db.commit()
-            session.clear()
-            flash("Your account has been deleted.", "success")
-            return redirect("/register")
-
-    # Load avatar options
-    avatar_path = os.path.join("static", "images", "avatars")
-    avatars = [f for f in os.listdir(avatar_path) if f.endswith(".png") or f.endswith(".jpg")]
-    avatars.sort()
-
-    return render_template("settings.html", avatars=avatars)
-
-# Rank Feature
-@app.route("/rank")
-@login_required
-def rank_page():
-    """
-    Get user's rankings and render the rank page.
-    """
-    db = get_db()
-    user_id = current_user.id
-
-    tiers = [
-        "ABSOLUTE CINEMA", "GREAT", "GOOD", "COULD BE BETTER", "BAD",
-        "WATCHED", "WATCHING", "WATCHLIST"
-    ]
-
-    user_ratings = db.execute("""
-        SELECT tmdb_id, rank, media_type
-        FROM user_ratings
-        WHERE user_id = ? AND visible_in_rank = 1
-    """, (user_id,)).fetchall()
-
-    tier_data = {tier: [] for tier in tiers}
-
-    for rating in user_ratings:
-        tmdb_id = rating["tmdb_id"]
-        rank = rating["rank"]
-        media_type = rating["media_type"]
-
-        if media_type == "show":
-            media_type = "tv"
-
-        if rank not in tiers:
-            continue
-
-        details = get_title_details(tmdb_id, media_type)
-        if details:
-            tier_data[rank].append(details)
-
-    return render_template("rank.html", tier_data=tier_data)
-
-# Rank Feature - Update Rankings
-@app.route("/rank/update", methods=["POST"])
-@login_required
-def rank_update():
-    """
-    Handle asynchronous updates when a card is dropped
-    into a new tier via SortableJS.
-    """
-    db = get_db()
-    user_id = current_user.id
-    title_id = request.form.get("title_id")
-    new_rank = request.form.get("new_rank")
-    media_type = request.form.get("media_type")
-    if media_type:
-        media_type = media_type.strip().lower()
-        if media_type == "tv":
-            media_type = "show"
-
-    if title_id and new_rank and media_type:
-        db.execute("""
-            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, visible_in_rank)
-            VALUES (?, ?, ?, ?, 1)
-            ON CONFLICT(user_id, tmdb_id)
-            DO UPDATE SET rank = excluded.rank, media_type = excluded.media_type, visible_in_rank = 1
-        """, (user_id, title_id, new_rank, media_type))
-        db.commit()
-        return jsonify({"status": "success"})
-    
-    return jsonify({"status": "error", "message": "Missing data"}), 400
-
-# Rank Feature - Clear Rankings
-@app.route("/rank/clear", methods=["POST"])
-@login_required
-def rank_clear():
-    """
-    Set all user ratings to not visible in rank.
-    """
-    db = get_db()
-    user_id = current_user.id
-
-    db.execute("""
-        UPDATE user_ratings
-        SET visible_in_rank = 0
-        WHERE user_id = ? AND rank NOT IN ('WATCHED', 'WATCHING', 'WATCHLIST')
-    """, (user_id,))
-    db.commit()
-
-    return jsonify({"status": "cleared"})
-
-# Watchlist Feature
-@app.route("/watchlist")
-@login_required
-def watchlist():
-    """
-    Display all titles in the current user's watchlist.
-    Fetch details for each via get_title_details().
-    """
-    db = get_db()
-    user_id = current_user.id
-
-    rows = db.execute("""
-        SELECT tmdb_id, media_type FROM user_ratings
-        WHERE user_id = ? AND rank = 'WATCHLIST'
-    """, (user_id,)).fetchall()
-
-    titles = []
-    for row in rows:
-        tmdb_id = row["tmdb_id"]
-        media_type = row["media_type"]
-        details = get_title_details(tmdb_id, "tv" if media_type == "show" else "movie")
-        if details:
-            titles.append(details)
-
-    return render_template("watchlist.html", titles=titles)
-
-# Watchlist Feature - Update Watchlist
-@app.route("/watchlist/update", methods=["POST"])
-@login_required
-def update_watchlist():
-    """
-    Update a single title from WATCHLIST to WATCHED or NOT_INTERESTED.
-    """
-    db = get_db()
-    user_id = current_user.id
-    tmdb_id = request.form.get("tmdb_id")
-    new_rank = request.form.get("rank")
-
-    if tmdb_id and new_rank in ["WATCHED", "NOT_INTERESTED"]:
-        db.execute("""
-            UPDATE user_ratings
-            SET rank = ?
-            WHERE user_id = ? AND tmdb_id = ?
-        """, (new_rank, user_id, tmdb_id))
-        db.commit()
-    
-    return redirect(url_for("watchlist"))
-
-# Search Function
-@app.route("/search")
-def search():
-    """
-    Show search results for query 'q' using TMDb search_title().
-    Annotate each result with current user's rank if logged in.
-    """
-
-    query = request.args.get("q", "")
-    results = search_title(query) if query else []
-
-    # Attach user-specific rank to each result
-    if current_user.is_authenticated:
-        db = get_db()
-        user_id = current_user.id
-        for title in results:
-            media_type = title["media_type"]
-            tmdb_id = title["id"]
-            row = db.execute("""
-                SELECT rank FROM user_ratings
-                WHERE user_id = ? AND tmdb_id = ? AND media_type = ?
-            """, (user_id, tmdb_id, "show" if media_type == "tv" else media_type)).fetchone()
-            title["user_rank"] = row["rank"] if row else None
-    else:
-        for title in results:
-            title["user_rank"] = None
-
-    return render_template("search_results.html", query=query, results=results)
-
-# Helper function
-def fetch_tmdb_details(tmdb_id, media_type):
-    """
-    Fetch basic details like name and poster_url from TMDb for one title.
-    Used in multiple places (watchlist, profile, etc.).
-    """
-    try:
-        url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}"
-        params = {"api_key": API_KEY, "language": "en-US"}
-        res = requests.get(url, params=params)
-        data = res.json()
-        return {
-            "tmdb_id": tmdb_id,
-            "media_type": media_type,
-            "name": data.get("title") or data.get("name") or "Untitled",
-            "poster_url": f"https://image.tmdb.org/t/p/w500{data.get('poster_path')}" if data.get("poster_path") else None
-        }
-    except:
-        return {
-            "tmdb_id": tmdb_id,
-            "media_type": media_type,
-            "name": "Unknown",
-            "poster_url": None
-        }
-
-# User Profile
-@app.route("/profile")
-@login_required
-def own_profile():
-    """
-    Redirect to the public profile page of current user.
-    """
-    return redirect(url_for("profile", username=current_user.username))
-
-# Profile by username
-@app.route("/profile/<username>")
-def profile(username):
-    """
-    Display user profile with stats, recent ranks,
-    top10 movies/shows.
-    """
-    db = get_db()
-    user = db.execute("SELECT id, username, avatar FROM users WHERE username = ?", (username,)).fetchone()
-    if not user:
-        return render_template("404.html"), 404
-
-    user_id = user["id"]
-
-    # Stats
-    stats = {
-        "watched": db.execute("""
-            SELECT COUNT(*) FROM user_ratings
-            WHERE user_id = ? AND rank IN (
-                'WATCHED', 'WATCHING', 'ABSOLUTE CINEMA', 'GREAT', 'GOOD', 'COULD BE BETTER', 'BAD'
-            )
-        """, (user_id,)).fetchone()[0],
-        "watchlist": db.execute("""
-            SELECT COUNT(*) FROM user_ratings WHERE user_id = ? AND rank = 'WATCHLIST'
-        """, (user_id,)).fetchone()[0],
-        "ranks": {}
-    }
-
-    ranks = ["ABSOLUTE CINEMA", "GREAT", "GOOD", "COULD BE BETTER", "BAD", "WATCHING", "WATCHLIST"]
-    for rank in ranks:
-        stats["ranks"][rank] = db.execute("""
-            SELECT COUNT(*) FROM user_ratings
-            WHERE user_id = ? AND rank = ?
-        """, (user_id, rank)).fetchone()[0]
-
-    # Full Rank
-    user_ranks = {}
-    for rank in ranks:
-        rows = db.execute("""
-            SELECT tmdb_id, media_type
-            FROM user_ratings
-            WHERE user_id = ? AND rank = ?
-            ORDER BY created DESC
-        """, (user_id, rank)).fetchall()
-
-        user_ranks[rank] = [
-            fetch_tmdb_details(row["tmdb_id"], "tv" if row["media_type"] == "show" else row["media_type"])
-            for row in rows
-        ]
-
-    # Top 10 Movies
-    top10_movies_rows = db.execute("""
-        SELECT tmdb_id, media_type
-        FROM user_ratings
-        WHERE user_id = ? AND top10_position IS NOT NULL AND media_type = 'movie'
-        ORDER BY top10_position
-    """, (user_id,)).fetchall()
-
-    top10_movies = [
-        fetch_tmdb_details(row["tmdb_id"], row["media_type"])
-        for row in top10_movies_rows
-    ]
-
-    # Top 10 Shows
-    top10_shows_rows = db.execute("""
-        SELECT tmdb_id, media_type
-        FROM user_ratings
-        WHERE user_id = ? AND top10_position IS NOT NULL AND media_type = 'show'
-        ORDER BY top10_position
-    """, (user_id,)).fetchall()
-
-    top10_shows = [
-        fetch_tmdb_details(row["tmdb_id"], "tv")
-        for row in top10_shows_rows
-    ]
-
-    return render_template("profile.html",
-                           user=user,
-                           stats=stats,
-                           user_ranks=user_ranks,
-                           top10_movies=top10_movies,
-                           top10_shows=top10_shows)
-
-# Redirect user to login if not authenticated
-@login_manager.unauthorized_handler
-def unauthorized():
-    flash("Please log in to access this page.", "error")
-    return redirect(url_for('login'))
-
-# Title Details
-@app.route("/title/<int:title_id>")
-@login_required
-def title_detail(title_id):
-    """
-    Show detailed page for a title (movie or TV show),
-    including episodes list and watched toggles.
-    """
-    db = get_db()
-    user_id = current_user.id
-
-    media_type = request.args.get("media_type", "movie")
-    details = get_title_details(title_id, media_type)
-
-    if not details:
-        return "Title not found", 404
-
-    # Get episodes if it's a TV show
-    episodes = []
-    if details["type"] == "show":
-        episodes = get_episodes_for_tv_show(title_id)
-
-    # Get user rank for this title
-    user_rank = db.execute("""
-        SELECT rank FROM user_ratings
-        WHERE user_id = ? AND tmdb_id = ?
-    """, (user_id, title_id)).fetchone()
-
-    # Get watched episodes
-    watched_rows = db.execute("""
-        SELECT season, episode FROM user_episodes_watched
-        WHERE user_id = ? AND tmdb_id = ?
-    """, (user_id, title_id)).fetchall()
-
-    watched_set = {(row["season"], row["episode"]) for row in watched_rows}
-
-    return render_template(
-        "title_detail.html",
-        title=details,
-        episodes=episodes,
-        user_rank=user_rank["rank"] if user_rank else None,
-        watched_set=watched_set
-    )
-
-# Title Detail - Quick Rank
-@app.route("/rank/quick", methods=["POST"])
-@login_required
-def rank_title_quick():
-    """
-    Rank a title from the title detail page using buttons.
-    """
-    db = get_db()
-    title_id = request.form.get("title_id")
-    rank = request.form.get("rank")
-    media_type = request.form.get("media_type")
-    if media_type == "tv":
-        media_type = "show"
-
-
-    if title_id and rank and media_type:
-        db.execute("""
-            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, visible_in_rank)
-            VALUES (?, ?, ?, ?, 1)
-            ON CONFLICT(user_id, tmdb_id)
-            DO UPDATE SET rank = excluded.rank, media_type = excluded.media_type, visible_in_rank = 1
-        """, (current_user.id, title_id, rank, media_type))
-        db.commit()
-
-    return "", 204
-
-# Title Detail - Toggle Episode Watched
-@app.route("/toggle_episode", methods=["POST"])
-@login_required
-def toggle_episode():
-    """
-    Change the watched status of a specific episode for the current user.
-    """
-    db = get_db()
-    tmdb_id = request.form.get("tmdb_id")
-    season = request.form.get("season")
-    episode = request.form.get("episode")
-    user_id = current_user.id
-
-    # Check if already exists
-    existing = db.execute("""
-        SELECT watched FROM user_episodes_watched
-        WHERE user_id = ? AND tmdb_id = ? AND season = ? AND episode = ?
-    """, (user_id, tmdb_id, season, episode)).fetchone()
-
-    if existing:
-        # Change the value
-        new_value = 0 if existing["watched"] else 1
-        db.execute("""
-            UPDATE user_episodes_watched
-            SET watched = ?
-            WHERE user_id = ? AND tmdb_id = ? AND season = ? AND episode = ?
-        """, (new_value, user_id, tmdb_id, season, episode))
-    else:
-        db.execute("""
-            INSERT INTO user_episodes_watched (user_id, tmdb_id, season, episode, watched)
-            VALUES (?, ?, ?, ?, 1)
-        """, (user_id, tmdb_id, season, episode))
-
-    db.commit()
-    return redirect(request.referrer or "/")
-
-# Watchlist Ranking Feature
-@app.route("/title/<int:title_id>/rank", methods=["POST"])
-@login_required
-def rank_title_realtime(title_id):
-    """
-    Change title rank from Watchlist Page.
-    """
-    db = get_db()
-    rank = request.form.get("rank")
-    user_id = current_user.id
-
-    if not rank:
-        return jsonify({"status": "error", "message": "No rank provided"}), 400
-
-    existing = db.execute("""
-        SELECT * FROM user_ratings
-        WHERE user_id = ? AND tmdb_id = ?
-    """, (user_id, title_id)).fetchone()
-
-    if existing:
-        db.execute("""
-            UPDATE user_ratings
-            SET rank = ?
-            WHERE user_id = ? AND tmdb_id = ?
-        """, (rank, user_id, title_id))
-    else:
-        db.execute("""
-            INSERT INTO user_ratings (user_id, tmdb_id, rank)
-            VALUES (?, ?, ?)
-        """, (user_id, title_id, rank))
-
-    db.commit()
-    return jsonify({"status": "success"})
-
-# Top 10 Feature
-@app.route("/top10")
-@login_required
-def top10_page():
-    """
-    Render the Top 10 selection page with draggable lists.
-    """
-    db = get_db()
-    user_id = current_user.id
-
-    # Filmes
-    movies_rows = db.execute("""
-        SELECT tmdb_id FROM user_ratings
-        WHERE user_id = ? AND media_type = 'movie' AND top10_position IS NOT NULL
-        ORDER BY top10_position
-    """, (user_id,)).fetchall()
-
-    # Séries
-    shows_rows = db.execute("""
-        SELECT tmdb_id FROM user_ratings
-        WHERE user_id = ? AND media_type = 'show' AND top10_position IS NOT NULL
-        ORDER BY top10_position
-    """, (user_id,)).fetchall()
-
-    def search_title_by_id(tmdb_id, media_type):
-        url = f"https://api.themoviedb.org/3/{media_type}/{tmdb_id}?api_key=86babcc2b25137bd5e895bb023520c67&language=en"
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.json()
-        return None
-
-    # Busca detalhes completos de cada título via função search_title_by_id
-    movies = [search_title_by_id(row["tmdb_id"], "movie") for row in movies_rows]
-    shows = [search_title_by_id(row["tmdb_id"], "tv") for row in shows_rows]
-
-    # Monta lista para renderização com nome e poster
-    def format_title(t, media_type):
-        return {
-            "id": t["id"],
-            "name": t.get("title") or t.get("name"),
-            "poster_url": f"https://image.tmdb.org/t/p/w200{t.get('poster_path')}" if t.get("poster_path") else "/static/images/placeholder.png"
-        }
-
-    movies = [format_title(m, "movie") for m in movies if m]
-    shows = [format_title(s, "tv") for s in shows if s]
-
-    return render_template("top10.html", movies=movies, shows=shows)
-
-# Top 10 Feature - Save Rankings
-@app.route("/top10/save", methods=["POST"])
-@login_required
-def save_top10():
-    """
-    Save the ordering of Top 10 movies and shows
-    for the current user.
-    """
-    db = get_db()
-    user_id = current_user.id
-    data = request.get_json()
-
-    # Reset top10_position for this user
-    db.execute("""
-        UPDATE user_ratings
-        SET top10_position = NULL
-        WHERE user_id = ?
-    """, (user_id,))
-
-    for index, tmdb_id in enumerate(data.get("movies", [])):
-        db.execute("""
-            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, top10_position)
-            VALUES (?, ?, NULL, ?, ?)
-            ON CONFLICT(user_id, tmdb_id)
-            DO UPDATE SET top10_position = excluded.top10_position
-        """, (user_id, tmdb_id, "movie", index + 1))
-
-    for index, tmdb_id in enumerate(data.get("shows", [])):
-        db.execute("""
-            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, top10_position)
-            VALUES (?, ?, NULL, ?, ?)
-            ON CONFLICT(user_id, tmdb_id)
-            DO UPDATE SET top10_position = excluded.top10_position
-        """, (user_id, tmdb_id, "show", index + 1))
-
-    db.commit()
-    return jsonify({"status": "saved"})
-
-@app.route("/api/search")
-@login_required
-def api_search():
-    """
-    Search bar on Top 10 Page.
-    """
-    query = request.args.get("q", "")
-    results = search_title(query) if query else []
-
-    # Convert "tv" media type to "show"
-    for item in results:
-        if item["media_type"] == "tv":
-            item["media_type"] = "show"
-
-    return jsonify(results)
-
-# Finder Feature - Load and display a random video from the YouTube playlist
-@app.route("/api/random_video")
-def random_video():
-    """
-    Return JSON of a random video from predefined YouTube playlist.
-    """
-    try:
-        PLAYLIST_ID = "PL86SiVwkw_oeDQoAZwcuyoyG43eKWtbJM"
-        API_KEY = os.getenv("YOUTUBE_API_KEY")
-
-        if not API_KEY:
-            return jsonify({"error": "Missing API key"}), 500
-
-        all_videos = []
-        next_page_token = None
-
-        while True:
-            params = {
-                "part": "snippet",
-                "playlistId": PLAYLIST_ID,
-                "maxResults": 50,
-                "key": API_KEY
-            }
-            if next_page_token:
-                params["pageToken"] = next_page_token
-
-            response = requests.get("https://www.googleapis.com/youtube/v3/playlistItems", params=params)
-            data = response.json()
-
-            items = data.get("items", [])
-            all_videos.extend(items)
-
-            next_page_token = data.get("nextPageToken")
-            if not next_page_token or len(all_videos) >= 200:
-                break  # Limit to 200 videos
-
-        if not all_videos:
-            return jsonify({"error": "No videos found"}), 404
-
-        # Pick a random video from the list
-        video = random.choice(all_videos)
-        snippet = video["snippet"]
-        video_id = snippet["resourceId"]["videoId"]
-        title = snippet.get("title", "Untitled")
-        description = snippet.get("description", "")
-
-        return jsonify({
-            "videoId": video_id,
-            "title": title,
-            "description": description
-        })
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-# Finder Feature
-@app.route("/finder")
-def finder_page():
-    """
-    Render the finder page for random video lookup.
-    """
-    return render_template("finder.html")
-
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+"""
+Main application module for 2WATCH Flask app.
+
+This module defines the Flask app, configures login/session management,
+sets up database connections, and registers all routes for:
+- Home page and API endpoints (search, popular, now_playing, discover, genres, upcoming)
+- User authentication (register, login, logout)
+- Watchlist and ranking features
+- Profile and title details pages
+- Helper functions for TMDb API integration
+"""
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, flash, send_file, Response
+import sqlite3  # SQLite database connection
+import os       # Operating system utilities (paths, env)
+import click     # Flask CLI commands
+import mimetypes # Content types for built assets
+import time      # Request timing for /metrics
+import hmac      # Constant-time comparison of the metrics token
+import base64    # Opaque pagination cursors
+import json      # Pagination cursor payloads
+from tmdb import list_cache, cached_get_json, fetch_all, search_title, get_title_data, format_title_details, get_season, get_episodes_for_tv_show
+from refresher import refresher
+from youtube import finder_playlist
+from genres import genre_registry
+from catalog import CATALOG_COLUMNS, CATALOG_JOIN, save_titles, details_from_rows
+from db import get_pool
+from watched import episode_bit, mask_episodes, season_masks, get_watched, apply_masks, toggle_watched, progress, next_unwatched
+from images import IMAGE_MAX_AGE, image_url, parse_size, valid_filename, upstream_url, get_image
+from assets import ASSET_MAX_AGE, DEFAULT_AVATAR, asset_manifest
+from http_cache import json_bytes, make_etag, conditional_json
+from metrics import metrics, current_endpoint, record_request
+from user_cache import get_cached_user, cache_user, invalidate_user
+from status_index import index_key, get_status_index, get_ratings_version, bump_ratings_version
+from werkzeug.security import generate_password_hash, check_password_hash
+from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
+from dotenv import load_dotenv # Load environment variables from .env
+
+# Load environment variables (TMDB and YouTube API keys)
+load_dotenv()
+
+app = Flask(__name__)
+
+def asset_url_for(endpoint, **values):
+    """
+    url_for for templates: static CSS/JS and avatars that have a built,
+    fingerprinted copy are linked to it under /assets.
+    """
+    if endpoint == "static":
+        built = asset_manifest.lookup(values.get("filename"))
+        if built:
+            return url_for("built_asset", filename=built)
+    return url_for(endpoint, **values)
+
+app.jinja_env.globals["url_for"] = asset_url_for
+
+# Configure Flask-Login
+login_manager = LoginManager()
+login_manager.init_app(app)
+login_manager.login_view = "login"
+
+# Secret key for session signing
+app.secret_key = os.getenv("SECRET_KEY")
+
+# API Keys
+API_KEY = os.getenv("TMDB_API_KEY")
+YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+# Bearer token required by /metrics (when unset, only direct local requests are allowed)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Seconds browsers and shared caches may reuse public list responses
+LIST_MAX_AGE = int(os.getenv("LIST_MAX_AGE", 300))
+GENRES_MAX_AGE = int(os.getenv("GENRES_MAX_AGE", 24 * 60 * 60))
+
+# Number of recently shown Finder videos remembered per session
+SEEN_VIDEOS_LIMIT = 50
+
+# Tiers shown on the rank page, and titles loaded per tier request
+RANK_TIERS = [
+    "ABSOLUTE CINEMA", "GREAT", "GOOD", "COULD BE BETTER", "BAD",
+    "WATCHED", "WATCHING", "WATCHLIST"
+]
+RANK_PAGE_SIZE = int(os.getenv("RANK_PAGE_SIZE", 24))
+RANK_PAGE_MAX = 100
+
+# YouTube Channel IDs for video fetching
+CHANNEL_IDS = [
+    "UCzuqhhs6NWbgTzMuM09WKDQ",  # MOVIECLIPS
+    "UC5nG0U7W_4XEBrr2PzZRYWg"   # BoxofficeMoviesScenes
+]
+
+# User model and loader
+class User(UserMixin):
+    """
+    Simple User class for Flask-Login.
+    Holds id, username, avatar filename and session generation.
+    """
+    def __init__(self, id, username, avatar, generation=0):
+        self.id = id
+        self.username = username
+        self.avatar = avatar
+        self.generation = generation
+
+    def get_id(self):
+        """
+        Session (and remember cookie) token: "<id>:<generation>".
+        Bumping users.session_generation invalidates older tokens.
+        """
+        return f"{self.id}:{self.generation}"
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(id=row["id"], username=row["username"], avatar=row["avatar"], generation=row["session_generation"])
+
+@login_manager.user_loader
+def load_user(user_id):
+    """
+    Given a session token ("<id>:<generation>", or a bare id from older
+    sessions), return the User object, or None if the user is gone or the
+    session predates a password change. Users come from an in-process
+    cache when possible, so most requests do not query the database.
+    A session newer than the cached user (password changed through another
+    worker) makes the loader re-read the row once before deciding.
+    """
+    user_id, _, generation = str(user_id).partition(":")
+    try:
+        user_id, generation = int(user_id), int(generation or 0)
+    except ValueError:
+        return None
+
+    user = get_cached_user(user_id)
+    if user is not None and generation > user.generation:
+        invalidate_user(user_id)
+        user = None
+    if user is None:
+        row = get_read_db().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = User.from_row(row)
+        cache_user(user)
+
+    if user.generation != generation:
+        return None
+    return user
+
+# Database connection handling
+def get_db():
+    """
+    Returns a pooled read-write SQLite connection stored in flask.g for reuse.
+    Ensures row_factory is sqlite3.Row for named columns.
+    """
+    if "db" not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+def get_read_db():
+    """
+    Returns a pooled read-only SQLite connection stored in flask.g,
+    for code paths that never write.
+    """
+    if "read_db" not in g:
+        g.read_db = get_pool(readonly=True).acquire()
+    return g.read_db
+
+@app.teardown_appcontext
+def close_db(exception):
+    """
+    Returns the request's database connections to their pools.
+    """
+    db = g.pop("db", None)
+    if db is not None:
+        get_pool().release(db)
+    read_db = g.pop("read_db", None)
+    if read_db is not None:
+        get_pool(readonly=True).release(read_db)
+
+@app.before_request
+def start_request_metrics():
+    """
+    Tag the request with its endpoint so upstream, SQL and cache work is
+    counted against it, and start the latency timer.
+    """
+    g.metrics_start = time.perf_counter()
+    g.metrics_token = current_endpoint.set(request.endpoint or "unmatched")
+
+@app.after_request
+def record_request_metrics(response):
+    record_request(request.endpoint or "unmatched", request.method, response.status_code, time.perf_counter() - g.metrics_start)
+    g.metrics_recorded = True
+    return response
+
+@app.teardown_request
+def end_request_metrics(exception):
+    """
+    Count requests that ended in an unhandled exception, then untag the thread.
+    """
+    if "metrics_start" in g and not g.get("metrics_recorded"):
+        record_request(request.endpoint or "unmatched", request.method, 500, time.perf_counter() - g.metrics_start)
+    if "metrics_token" in g:
+        current_endpoint.reset(g.pop("metrics_token"))
+
+# Home
+@app.route("/")
+def index():
+    """
+    Render the home page template.
+    Contains main UI with carousels for popular, now playing, etc.
+    """
+    return render_template("home.html")
+
+# Helper function: per-user status overlay for title lists
+def apply_user_status(titles):
+    """
+    Set "user_status" on each title dict to the current user's rank
+    for it (None if unranked or not logged in). Applied after the
+    shared cache read, so cached lists never hold per-user data.
+    """
+    # Versioned per-user index; only rebuilt after the user's ratings change
+    status_index = get_status_index(get_read_db(), current_user.id) if current_user.is_authenticated else {}
+
+    for title in titles:
+        title["user_status"] = status_index.get(index_key(title["media_type"], title["tmdb_id"]))
+    return titles
+
+# Helper function: conditional response for shared payloads with a per-user overlay
+def overlay_response(payload, overlay, memo_key, max_age=LIST_MAX_AGE, complete=None):
+    """
+    Serve a global payload (same for everyone) that logged-in users get
+    with their own data applied by overlay(payload).
+    Anonymous requests get a public response whose compressed body is
+    reused; logged-in ones are private and validated by the payload plus
+    the user's ratings_version, so a 304 skips the overlay entirely.
+    complete(overlaid payload), if given, returning False means the
+    overlay is incomplete and must not be validated.
+    """
+    raw = json_bytes(payload)
+    etag = make_etag(raw)
+
+    if not current_user.is_authenticated:
+        response = conditional_json(etag, lambda: raw, public=True, max_age=max_age, memo_key=memo_key)
+    else:
+        version = get_ratings_version(get_read_db(), current_user.id)
+        overlaid = []
+
+        def build():
+            overlaid.append(overlay(payload))
+            return json_bytes(overlaid[0])
+
+        response = conditional_json(
+            make_etag(etag, current_user.id, version), build,
+            cacheable=(lambda: complete(overlaid[0])) if complete else None
+        )
+    response.vary.add("Cookie")
+    return response
+
+# Helper function: titles for one user-specific status (Watching, Watchlist, ...)
+def user_titles(status):
+    """
+    Return the current user's titles with the given rank, built from the
+    local catalog: tmdb_id, media_type, name, poster_url (plus
+    placeholder: true for titles that could not be loaded).
+    """
+    db = get_db()
+    rows = db.execute(f"""
+        SELECT r.tmdb_id, r.media_type, {CATALOG_COLUMNS}
+        FROM user_ratings r {CATALOG_JOIN}
+        WHERE r.user_id = ? AND r.rank = ?
+        ORDER BY r.created
+    """, (current_user.id, status)).fetchall()
+
+    # Title data comes from the local catalog
+    details_list = details_from_rows(db, rows)
+
+    results = []
+    for row, details in zip(rows, details_list):
+        # Build a consistent result object
+        result = {
+            "tmdb_id": row["tmdb_id"],
+            "media_type": row["media_type"],
+            "name": details["name"],
+            "poster_url": image_url(details["poster_path"], "thumb", placeholder=True)
+        }
+        if details.get("placeholder"):
+            result["placeholder"] = True
+        results.append(result)
+    return results
+
+# Helper function: True when no title in the list is a placeholder
+def all_loaded(titles):
+    return not any(title.get("placeholder") for title in titles)
+
+# Helper function: format a TMDb list result as a home page card
+def format_card(item, media_type):
+    return {
+        "tmdb_id": item["id"],
+        "name": item.get("title") or item.get("name"),
+        "media_type": media_type,
+        "poster_url": image_url(item.get("poster_path"), "poster", placeholder=True)
+    }
+
+# Helper functions: global TMDb lists, cached server-side and shared by all users
+def popular_titles():
+    """
+    Popular movies from TMDb, page 1.
+    """
+    params = {
+        "language": "en-US",
+        "page": 1
+    }
+    data = cached_get_json(list_cache, "/movie/popular", params=params) or {}
+    return [format_card(item, "movie") for item in data.get("results", [])]
+
+def now_playing_titles():
+    """
+    Now-playing movies in the US region, page 1.
+    """
+    params = {
+        "language": "en-US",
+        "page": 1,
+        "region": "US"
+    }
+    data = cached_get_json(list_cache, "/movie/now_playing", params=params) or {}
+    return [format_card(item, "movie") for item in data.get("results", [])]
+
+def discover_list(genres="", media_type="movie"):
+    """
+    Movies or TV discovered by genre filters, most popular first.
+    """
+    params = {
+        "language": "en-US",
+        "sort_by": "popularity.desc",
+        "with_genres": genres,
+        "page": 1
+    }
+    data = cached_get_json(list_cache, f"/discover/{media_type}", params=params) or {}
+    return [format_card(item, media_type) for item in data.get("results", [])]
+
+def genre_lists():
+    """
+    All TMDb genres for movie and TV, keyed by media type.
+    """
+    genre_registry.refresh_if_stale()
+    return genre_registry.lists
+
+def upcoming_titles():
+    """
+    Upcoming movies and on-the-air TV (first 8 each), fetched in parallel.
+    """
+    movie_params = {
+        "language": "en-US",
+        "page": 1,
+        "region": "US"
+    }
+    tv_params = {
+        "language": "en-US",
+        "page": 1
+    }
+    movie_data, tv_data = fetch_all([
+        lambda: cached_get_json(list_cache, "/movie/upcoming", params=movie_params),
+        lambda: cached_get_json(list_cache, "/tv/on_the_air", params=tv_params)
+    ])
+
+    combined_results = []
+
+    # --- MOVIES ---
+    for movie in (movie_data or {}).get("results", [])[:8]:
+        combined_results.append({
+            "tmdb_id": movie.get("id"),
+            "name": movie.get("title"),
+            "media_type": "movie",
+            "poster_url": image_url(movie.get("poster_path"), "poster"),
+            "backdrop_url": image_url(movie.get("backdrop_path"), "backdrop"),
+            "year": (movie.get("release_date") or "")[:4]
+        })
+
+    # --- TV SHOWS ---
+    for show in (tv_data or {}).get("results", [])[:8]:
+        combined_results.append({
+            "tmdb_id": show.get("id"),
+            "name": show.get("name"),
+            "media_type": "tv",
+            "poster_url": image_url(show.get("poster_path"), "poster"),
+            "backdrop_url": image_url(show.get("backdrop_path"), "backdrop"),
+            "year": (show.get("first_air_date") or "")[:4]
+        })
+
+    return combined_results
+
+# Home - All rows in one response (API Endpoint: cached TMDb Data + user data)
+@app.route("/api/home")
+def home_feed():
+    """
+    Return every home page row in one JSON response: upcoming carousel,
+    popular, now playing, discover, genres, and (when logged in) the
+    user's Watching and Watchlist rows. Global lists come from the
+    shared cache; user_status is overlaid afterwards.
+    """
+    try:
+        upcoming, popular, now_playing, discover, genres = fetch_all([
+            upcoming_titles, popular_titles, now_playing_titles, discover_list, genre_lists
+        ])
+        feed = {
+            "upcoming": upcoming,
+            "popular": popular,
+            "now_playing": now_playing,
+            "discover": discover,
+            "genres": genres,
+            "watching": [],
+            "watchlist": []
+        }
+
+        def add_user_rows(feed):
+            apply_user_status(feed["popular"] + feed["now_playing"] + feed["discover"])
+            feed["watching"] = user_titles("WATCHING")
+            feed["watchlist"] = user_titles("WATCHLIST")
+            return feed
+
+        return overlay_response(
+            feed, add_user_rows, "home",
+            complete=lambda feed: all_loaded(feed["watching"] + feed["watchlist"])
+        )
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# API endpoint: Fetch titles for a given user and status
+@app.route("/api/user_titles")
+@login_required
+def get_user_titles():
+    """
+    Return a JSON list of titles filtered by user-specific status.
+    Query param 'status' must be one of: WATCHED, WATCHLIST, NOT_INTERESTED.
+    """
+    status = request.args.get("status", "").upper()
+    if not status:
+        return jsonify([])
+
+    # The list only changes when the user's ratings do, unless some titles
+    # could not be loaded yet: then it is sent without a validator
+    version = get_ratings_version(get_read_db(), current_user.id)
+    titles = []
+
+    def build():
+        titles.extend(user_titles(status))
+        return json_bytes(titles)
+
+    response = conditional_json(
+        make_etag("user_titles", status, current_user.id, version), build,
+        cacheable=lambda: all_loaded(titles)
+    )
+    response.vary.add("Cookie")
+    return response
+
+# Home - Popular Now Row (API Endpoint: TMDb Data)
+@app.route("/api/tmdb/popular")
+def get_popular_movies():
+    """
+    Return JSON of popular movies from TMDb, page 1.
+    If user is logged in, include their saved status per title.
+    """
+    try:
+        return overlay_response(popular_titles(), apply_user_status, "popular")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Home - Now Playing in Theaters Row (API Endpoint: TMDb Data)
+@app.route("/api/tmdb/now_playing")
+def get_now_playing_movies():
+    """
+    Return JSON of now-playing movies in US region.
+    Similar to popular, includes user status if logged in.
+    """
+    try:
+        return overlay_response(now_playing_titles(), apply_user_status, "now_playing")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Home - Discover Titles Row (API Endpoint: TMDb Data)
+@app.route("/api/tmdb/discover")
+def discover_titles():
+    """
+    Return JSON of discovered movies or TV based on genre filters.
+    Query params: with_genres, media_type.
+    """
+    try:
+        genres = request.args.get("with_genres", "")
+        media_type = request.args.get("media_type", "movie")
+        return overlay_response(discover_list(genres, media_type), apply_user_status, f"discover:{media_type}:{genres}")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Home - API for genres filter list (API Endpoint: TMDb Data)
+@app.route("/api/genres")
+def get_genres():
+    """
+    Return JSON of all TMDb genres for movie and TV.
+    Used to populate filter checkboxes. The body is prebuilt by the
+    genre registry, so this does no TMDb call or JSON encoding, and its
+    compressed variants are reused.
+    """
+    try:
+        genre_registry.refresh_if_stale()
+        body = genre_registry.body
+        return conditional_json(make_etag(body), lambda: body, public=True, max_age=GENRES_MAX_AGE, memo_key="genres")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    
+# Home - Upcoming Titles Carousel (API Endpoint: TMDb Data)
+@app.route("/api/tmdb/upcoming")
+def tmdb_upcoming():
+    """
+    Return JSON of upcoming movies and on-the-air TV (first 8 each).
+    Used to build the homepage carousel.
+    """
+    try:
+        # Same for every user, so always public
+        raw = json_bytes(upcoming_titles())
+        return conditional_json(make_etag(raw), lambda: raw, public=True, max_age=LIST_MAX_AGE, memo_key="upcoming")
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Images - TMDb posters and backdrops, resized and cached on local disk
+@app.route("/img/<size>/<filename>")
+def tmdb_image(size, filename):
+    """
+    Serve a TMDb image at the given width (e.g. /img/w200/abc.jpg).
+    Stored variants never change, so they are cached for a year; range
+    and conditional requests are handled by send_file.
+    """
+    width = parse_size(size)
+    if width is None or not valid_filename(filename):
+        return "Image not found", 404
+
+    image = get_image(width, filename, accept_webp="image/webp" in request.headers.get("Accept", ""))
+    if image is None:
+        # Upstream fetch failed: let the browser try TMDb directly
+        return redirect(upstream_url(width, filename))
+
+    path, digest, mimetype = image
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=digest, max_age=IMAGE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept")
+    return response
+
+# Fingerprinted static assets (content-hashed names, so cached forever)
+@app.route("/assets/<path:filename>")
+def built_asset(filename):
+    """
+    Serve a built asset, using its precompressed .br/.gz variant when the
+    client accepts one.
+    """
+    path, encoding = asset_manifest.precompressed(filename, request.accept_encodings)
+    if path is None or not os.path.isfile(path):
+        return "Not found", 404
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept-Encoding")
+    return response
+
+# Registration
+@app.route("/register", methods=["GET", "POST"])
+def register():
+    db = get_db()
+
+    if request.method == "POST":
+        username = request.form.get("username")
+        password = request.form.get("password")
+        confirmation = request.form.get("confirmation")
+        avatar = request.form.get("avatar")
+        if avatar not in asset_manifest.avatar_names:
+            avatar = DEFAULT_AVATAR
+
+        if not username or not password or not confirmation:
+            flash("Please fill out all fields.", "error")
+            return redirect("/register")
+
+        if password != confirmation:
+            flash("Passwords do not match.", "error")
+            return redirect("/register")
+
+        # Password hashing
+        hashed = generate_password_hash(password)
+
+        try:
+            db.execute(
+                "INSERT INTO users (username, password, avatar) VALUES (?, ?, ?)",
+                (username, hashed, avatar)
+            )
+            db.commit()
+        except sqlite3.IntegrityError:
+            flash("Username already exists.", "error")
+            return redirect("/register")
+
+        flash("Account created successfully!", "success")
+        return redirect("/login")
+
+    return render_template("register.html", avatars=asset_manifest.avatars, avatar_sprite=asset_manifest.sprite)
+
+# Login
+@app.route("/login", methods=["GET", "POST"])
+def login():
+    if request.method == "POST":
+        username = request.form.get("username")
+        password = request.form.get("password")
+
+        db = get_db()
+        user = db.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+
+        if user is None or not check_password_hash(user["password"], password):
+            flash("Invalid username or password.", "error")
+            return redirect(url_for("login"))
+
+        login_user(User.from_row(user), remember=True)
+        flash("Login successful!", "success")
+        return redirect(url_for("index"))
+
+    return render_template("login.html")
+
+# Logout
+@app.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    flash("You have been logged out.", "success")
+    return redirect(url_for("login"))
+
+# Helper function
+def get_genre_ids(selected_names):
+    """
+    Convert list of genre names to TMDb genre IDs using the genre registry.
+    """
+    return genre_registry.ids_for_names(selected_names)
+
+# Menu Mobile
+@app.route("/menu-mobile")
+def menu_mobile():
+    return render_template("menu_mobile.html")
+
+# Settings Page
+@app.route("/settings", methods=["GET", "POST"])
+@login_required
+def settings():
+    db = get_db()
+    user_id = current_user.id
+
+    if request.method == "POST":
+        form_type = request.form.get("form_type")
+
+        # Change Username
+        if form_type == "change_username":
+            new_username = request.form.get("new_username")
+            if not new_username:
+                flash("Username cannot be empty.", "error")
+            else:
+                try:
+                    db.execute("UPDATE users SET username = ? WHERE id = ?", (new_username, user_id))
+                    db.commit()
+                    invalidate_user(user_id)
+                    current_user.username = new_username
+                    flash("Username updated successfully.", "success")
+                except sqlite3.IntegrityError:
+                    flash("Username already exists.", "error")
+
+        # Change Password
+        elif form_type == "change_password":
+            current = request.form.get("current_password")
+            new = request.form.get("new_password")
+            confirm = request.form.get("confirm_password")
+
+            row = db.execute("SELECT password FROM users WHERE id = ?", (user_id,)).fetchone()
+            if not check_password_hash(row["password"], current):
+                flash("Current password is incorrect.", "error")
+            elif new != confirm:
+                flash("New passwords do not match.", "error")
+            else:
+                # A new generation signs out every other session of this user
+                db.execute("""
+                    UPDATE users SET password = ?, session_generation = session_generation + 1
+                    WHERE id = ?
+                """, (generate_password_hash(new), user_id))
+                db.commit()
+                invalidate_user(user_id)
+                user = db.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+                login_user(User.from_row(user), remember=True)
+                flash("Password updated successfully.", "success")
+
+        # Change Avatar
+        elif form_type == "change_avatar":
+            new_avatar = request.form.get("avatar")
+            if new_avatar in asset_manifest.avatar_names:
+                db.execute("UPDATE users SET avatar = ? WHERE id = ?", (new_avatar, user_id))
+                db.commit()
+                invalidate_user(user_id)
+                current_user.avatar = new_avatar
+                flash("Avatar updated!", "success")
+
+        # Delete Account
+        elif form_type == "delete_account":
+            db.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            db.commit()
+            invalidate_user(user_id)
+            session.clear()
+            flash("Your account has been deleted.", "success")
+            return redirect("/register")
+
+    return render_template("settings.html", avatars=asset_manifest.avatars, avatar_sprite=asset_manifest.sprite)
+
+# Rank Feature
+@app.route("/rank")
+@login_required
+def rank_page():
+    """
+    Render the rank page skeleton: tier headers and empty dropzones with
+    each tier's size. Titles are loaded per tier from /api/rank/tier.
+    """
+    rows = get_read_db().execute("""
+        SELECT rank, COUNT(*) AS count
+        FROM user_ratings
+        WHERE user_id = ? AND visible_in_rank = 1
+        GROUP BY rank
+    """, (current_user.id,)).fetchall()
+    counts = {row["rank"]: row["count"] for row in rows}
+
+    tier_counts = {tier: counts.get(tier, 0) for tier in RANK_TIERS}
+    return render_template("rank.html", tier_counts=tier_counts)
+
+def encode_cursor(created, rating_id):
+    """
+    Opaque keyset cursor for the position after (created, rating_id).
+    """
+    return base64.urlsafe_b64encode(json.dumps([created, rating_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """
+    Return (created, rating_id) from a cursor; raises ValueError if malformed.
+    """
+    try:
+        created, rating_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(created, str) or not isinstance(rating_id, int):
+        raise ValueError("Invalid cursor")
+    return created, rating_id
+
+# Rank Feature - One page of a tier (API Endpoint: user data + catalog)
+@app.route("/api/rank/tier")
+@login_required
+def rank_tier():
+    """
+    Return one page of a rank tier, oldest first, as JSON:
+    {"rank", "titles": [...], "next": cursor or null}.
+    Query params: rank, after (cursor from the previous page), limit.
+    Pages are keyed on (created, id), so titles moved between tiers
+    never shift the pages that are still to be loaded.
+    """
+    try:
+        rank = request.args.get("rank")
+        if rank not in RANK_TIERS:
+            return jsonify({"error": "Unknown rank"}), 400
+        limit = min(max(request.args.get("limit", RANK_PAGE_SIZE, type=int), 1), RANK_PAGE_MAX)
+        try:
+            after = decode_cursor(request.args["after"]) if request.args.get("after") else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        db = get_db()
+        sql = f"""
+            SELECT r.id, r.created, r.tmdb_id, COALESCE(r.media_type, 'movie') AS media_type, {CATALOG_COLUMNS}
+            FROM user_ratings r {CATALOG_JOIN}
+            WHERE r.user_id = ? AND r.rank = ? AND r.visible_in_rank = 1
+        """
+        params = [current_user.id, rank]
+        if after:
+            sql += " AND (r.created, r.id) > (?, ?)"
+            params += list(after)
+        sql += " ORDER BY r.created, r.id LIMIT ?"
+        # One extra row tells whether there is another page
+        rows = db.execute(sql, params + [limit + 1]).fetchall()
+
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1]["created"], page[-1]["id"]) if len(rows) > limit else None
+        titles = [
+            {
+                "id": details["id"],
+                "name": details["name"],
+                "media_type": "show" if details["media_type"] in ("tv", "show") else "movie",
+                "image_url": details.get("thumb_url") or details["poster_url"]
+            }
+            for details in details_from_rows(db, page)
+        ]
+        return jsonify({"rank": rank, "titles": titles, "next": next_cursor})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Rank Feature - Update Rankings
+@app.route("/rank/update", methods=["POST"])
+@login_required
+def rank_update():
+    """
+    Handle asynchronous updates when a card is dropped
+    into a new tier via SortableJS.
+    """
+    db = get_db()
+    user_id = current_user.id
+    title_id = request.form.get("title_id")
+    new_rank = request.form.get("new_rank")
+    media_type = request.form.get("media_type")
+    if media_type:
+        media_type = media_type.strip().lower()
+        if media_type == "tv":
+            media_type = "show"
+
+    if title_id and new_rank and media_type:
+        # Fetch the catalog row before writing, so no TMDb call holds the write lock
+        save_titles(db, [(title_id, media_type)])
+        db.execute("""
+            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, visible_in_rank)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(user_id, tmdb_id)
+            DO UPDATE SET rank = excluded.rank, media_type = excluded.media_type, visible_in_rank = 1
+        """, (user_id, title_id, new_rank, media_type))
+        bump_ratings_version(db, user_id)
+        db.commit()
+        return jsonify({"status": "success"})
+    
+    return jsonify({"status": "error", "message": "Missing data"}), 400
+
+# Rank Feature - Clear Rankings
+@app.route("/rank/clear", methods=["POST"])
+@login_required
+def rank_clear():
+    """
+    Set all user ratings to not visible in rank.
+    """
+    db = get_db()
+    user_id = current_user.id
+
+    db.execute("""
+        UPDATE user_ratings
+        SET visible_in_rank = 0
+        WHERE user_id = ? AND rank NOT IN ('WATCHED', 'WATCHING', 'WATCHLIST')
+    """, (user_id,))
+    bump_ratings_version(db, user_id)
+    db.commit()
+
+    return jsonify({"status": "cleared"})
+
+# Watchlist Feature
+@app.route("/watchlist")
+@login_required
+def watchlist():
+    """
+    Display all titles in the current user's watchlist.
+    Title data comes from the local catalog (titles table).
+    """
+    db = get_db()
+    user_id = current_user.id
+
+    rows = db.execute(f"""
+        SELECT r.tmdb_id, COALESCE(r.media_type, 'movie') AS media_type, {CATALOG_COLUMNS}
+        FROM user_ratings r {CATALOG_JOIN}
+        WHERE r.user_id = ? AND r.rank = 'WATCHLIST'
+        ORDER BY r.created
+    """, (user_id,)).fetchall()
+
+    titles = details_from_rows(db, rows)
+
+    return render_template("watchlist.html", titles=titles)
+
+# Watchlist Feature - Update Watchlist
+@app.route("/watchlist/update", methods=["POST"])
+@login_required
+def update_watchlist():
+    """
+    Update a single title from WATCHLIST to WATCHED or NOT_INTERESTED.
+    """
+    db = get_db()
+    user_id = current_user.id
+    tmdb_id = request.form.get("tmdb_id")
+    new_rank = request.form.get("rank")
+
+    if tmdb_id and new_rank in ["WATCHED", "NOT_INTERESTED"]:
+        db.execute("""
+            UPDATE user_ratings
+            SET rank = ?
+            WHERE user_id = ? AND tmdb_id = ?
+        """, (new_rank, user_id, tmdb_id))
+        bump_ratings_version(db, user_id)
+        db.commit()
+    
+    return redirect(url_for("watchlist"))
+
+# Search Function
+@app.route("/search")
+def search():
+    """
+    Show search results for query 'q' using TMDb search_title().
+    Annotate each result with current user's rank if logged in.
+    """
+
+    query = request.args.get("q", "")
+    results = search_title(query) if query else []
+
+    # Attach user-specific rank to each result from the status index
+    if current_user.is_authenticated:
+        status_index = get_status_index(get_read_db(), current_user.id)
+        for title in results:
+            title["user_rank"] = status_index.get(index_key(title["media_type"], title["id"]))
+    else:
+        for title in results:
+            title["user_rank"] = None
+
+    return render_template("search_results.html", query=query, results=results)
+
+# User Profile
+@app.route("/profile")
+@login_required
+def own_profile():
+    """
+    Redirect to the public profile page of current user.
+    """
+    return redirect(url_for("profile", username=current_user.username))
+
+# Profile by username
+@app.route("/profile/<username>")
+def profile(username):
+    """
+    Display user profile with stats, recent ranks,
+    top10 movies/shows.
+    """
+    db = get_db()
+    user = db.execute("SELECT id, username, avatar FROM users WHERE username = ?", (username,)).fetchone()
+    if not user:
+        return render_template("404.html"), 404
+
+    user_id = user["id"]
+
+    ranks = ["ABSOLUTE CINEMA", "GREAT", "GOOD", "COULD BE BETTER", "BAD", "WATCHING", "WATCHLIST"]
+
+    # Stats: one row kept up to date by triggers on user_ratings
+    counters = db.execute("SELECT * FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+    stats = {
+        "watched": counters["watched"] if counters else 0,
+        "watchlist": counters["watchlist"] if counters else 0,
+        "ranks": {
+            rank: counters[rank.lower().replace(" ", "_")] if counters else 0
+            for rank in ranks
+        }
+    }
+
+    # Full Rank and Top 10s: one ordered scan, grouped in Python
+    rows = db.execute(f"""
+        SELECT r.tmdb_id, COALESCE(r.media_type, 'movie') AS media_type, r.rank, r.top10_position, {CATALOG_COLUMNS}
+        FROM user_ratings r {CATALOG_JOIN}
+        WHERE r.user_id = ? AND (r.rank IN ({", ".join("?" for _ in ranks)}) OR r.top10_position IS NOT NULL)
+        ORDER BY r.created DESC
+    """, (user_id, *ranks)).fetchall()
+
+    # Title data for every row on the page comes from the local catalog
+    details_list = details_from_rows(db, rows)
+
+    user_ranks = {rank: [] for rank in ranks}
+    top10 = {"movie": [], "show": []}
+    for row, details in zip(rows, details_list):
+        if row["rank"] in user_ranks:
+            user_ranks[row["rank"]].append(details)
+        if row["top10_position"] is not None and row["media_type"] in top10:
+            top10[row["media_type"]].append((row["top10_position"], details))
+
+    top10_movies = [details for _, details in sorted(top10["movie"], key=lambda item: item[0])]
+    top10_shows = [details for _, details in sorted(top10["show"], key=lambda item: item[0])]
+
+    return render_template("profile.html",
+                           user=user,
+                           stats=stats,
+                           user_ranks=user_ranks,
+                           top10_movies=top10_movies,
+                           top10_shows=top10_shows)
+
+# Redirect user to login if not authenticated
+@login_manager.unauthorized_handler
+def unauthorized():
+    flash("Please log in to access this page.", "error")
+    return redirect(url_for('login'))
+
+# Title Details
+@app.route("/title/<int:title_id>")
+@login_required
+def title_detail(title_id):
+    """
+    Show detailed page for a title (movie or TV show),
+    including episodes list and watched toggles.
+    """
+    db = get_read_db()
+    user_id = current_user.id
+
+    media_type = request.args.get("media_type", "movie")
+    data = get_title_data(title_id, media_type)
+
+    if not data:
+        return "Title not found", 404
+    details = format_title_details(title_id, media_type, data)
+
+    # Seasons of a TV show; their episodes are loaded by the page on demand
+    seasons = show_seasons(data) if details["type"] == "show" else []
+
+    # Get user rank for this title
+    user_rank = db.execute("""
+        SELECT rank FROM user_ratings
+        WHERE user_id = ? AND tmdb_id = ?
+    """, (user_id, title_id)).fetchone()
+
+    return render_template(
+        "title_detail.html",
+        title=details,
+        seasons=seasons,
+        user_rank=user_rank["rank"] if user_rank else None,
+        progress=show_progress(db, user_id, title_id, seasons) if seasons else None
+    )
+
+# Helper function: regular seasons of a show from its TMDb details
+def show_seasons(data):
+    """
+    Return the show's seasons (specials excluded) as dicts:
+    season, name, episode_count.
+    """
+    return [
+        {
+            "season": season["season_number"],
+            "name": season.get("name") or f"Season {season['season_number']}",
+            "episode_count": season.get("episode_count") or 0
+        }
+        for season in data.get("seasons", [])
+        if season.get("season_number", 0) > 0
+    ]
+
+# Helper function: watched progress for a show
+def show_progress(db, user_id, tmdb_id, seasons):
+    """
+    Count the user's watched episodes against the show's episode counts
+    and find the next unwatched one, using the season bitmaps.
+    Returns a dict: watched, total, next ([season, episode] or None).
+    """
+    watched_masks = get_watched(db, user_id, tmdb_id)
+    all_masks = {season["season"]: (1 << season["episode_count"]) - 1 for season in seasons}
+    watched_count, total = progress(watched_masks, all_masks)
+    next_episode = next_unwatched(watched_masks, all_masks)
+    return {"watched": watched_count, "total": total, "next": list(next_episode) if next_episode else None}
+
+# Title Detail - Episodes of one season (JSON)
+@app.route("/api/title/<int:title_id>/season/<int:season_number>")
+@login_required
+def title_season(title_id, season_number):
+    """
+    Return one season's episodes with the current user's watched flags.
+    Loaded by the title page when a season is expanded; the TMDb part is
+    cached per season (longer for seasons that have finished airing).
+    """
+    try:
+        # Only ask TMDb for seasons the (cached) show actually has
+        show = get_title_data(title_id, "tv")
+        if show is None:
+            return jsonify({"error": "Show not found"}), 404
+        try:
+            check_episode({item["season"]: item["episode_count"] for item in show_seasons(show)}, season_number)
+        except ValueError:
+            return jsonify({"error": "Season not found"}), 404
+
+        season = get_season(title_id, season_number)
+        if season is None:
+            return jsonify({"error": "Season not found"}), 404
+
+        mask = get_watched(get_read_db(), current_user.id, title_id, [season_number]).get(season_number, 0)
+        return jsonify({
+            "season": season["season"],
+            "name": season["name"],
+            "finished": season["finished"],
+            "episodes": [
+                dict(ep, watched=bool(mask & episode_bit(ep["episode"])))
+                for ep in season["episodes"]
+            ]
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Title Detail - Quick Rank
+@app.route("/rank/quick", methods=["POST"])
+@login_required
+def rank_title_quick():
+    """
+    Rank a title from the title detail page using buttons.
+    """
+    db = get_db()
+    title_id = request.form.get("title_id")
+    rank = request.form.get("rank")
+    media_type = request.form.get("media_type")
+    if media_type == "tv":
+        media_type = "show"
+
+
+    if title_id and rank and media_type:
+        # Fetch the catalog row before writing, so no TMDb call holds the write lock
+        save_titles(db, [(title_id, media_type)])
+        db.execute("""
+            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, visible_in_rank)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT(user_id, tmdb_id)
+            DO UPDATE SET rank = excluded.rank, media_type = excluded.media_type, visible_in_rank = 1
+        """, (current_user.id, title_id, rank, media_type))
+        bump_ratings_version(db, current_user.id)
+        db.commit()
+
+    return "", 204
+
+# Title Detail - Toggle Episode Watched
+@app.route("/toggle_episode", methods=["POST"])
+@login_required
+def toggle_episode():
+    """
+    Change the watched status of a specific episode for the current user.
+    """
+    db = get_db()
+    try:
+        tmdb_id = int(request.form.get("tmdb_id"))
+        season = int(request.form.get("season"))
+        episode = int(request.form.get("episode"))
+        if season < 1 or episode < 1:
+            raise ValueError("season and episode numbers start at 1")
+        # Only episodes the show actually has
+        show = get_title_data(tmdb_id, "tv")
+        if show is None:
+            raise ValueError("show not found")
+        check_episode({item["season"]: item["episode_count"] for item in show_seasons(show)}, season, episode)
+    except (TypeError, ValueError):
+        return redirect(request.referrer or "/")
+
+    # Flip the episode's bit in the season bitmap
+    toggle_watched(db, current_user.id, tmdb_id, season, episode)
+    db.commit()
+    return redirect(request.referrer or "/")
+
+# Helper function: check an episode against the show's season list
+def check_episode(episode_counts, season, episode=None):
+    """
+    Raise ValueError unless season is one of the show's seasons and
+    episode (if given) is between 1 and that season's episode count.
+    episode_counts maps season number to episode count (see show_seasons).
+    """
+    if season not in episode_counts:
+        raise ValueError(f"season {season} does not exist")
+    if episode is not None and not 1 <= episode <= episode_counts[season]:
+        raise ValueError(f"episode {episode} does not exist in season {season}")
+
+# Helper function: expand bulk episode changes into season bitmask changes
+def expand_episode_changes(tmdb_id, changes, episode_counts):
+    """
+    Turn the changes of a bulk episode request into a list of
+    (season, mask, watched) bitmap changes. Each change is one of:
+      {"season": 1, "episode": 2, "watched": true}  - a single episode
+      {"season": 2, "watched": true}                - a whole season
+      {"through": [3, 5], "watched": true}          - everything up to S03E05
+    Seasons and episodes must exist in episode_counts ({season: episode
+    count} from the cached show details); ranges are resolved against the
+    cached episode list of the show.
+    Later changes win over earlier ones. Raises ValueError on bad input.
+    """
+    masks = []
+    for change in changes:
+        watched = bool(change.get("watched", True))
+
+        if "through" in change:
+            last_season, last_episode = (int(n) for n in change["through"])
+            check_episode(episode_counts, last_season, last_episode)
+            all_masks = season_masks(get_episodes_for_tv_show(tmdb_id, range(1, last_season + 1)))
+            for season, mask in all_masks.items():
+                if season < last_season:
+                    masks.append((season, mask, watched))
+            # Episodes 1..last_episode of the last season
+            last_mask = all_masks.get(last_season, 0) & ((1 << last_episode) - 1)
+            masks.append((last_season, last_mask, watched))
+        elif "episode" in change:
+            season, episode = int(change["season"]), int(change["episode"])
+            check_episode(episode_counts, season, episode)
+            masks.append((season, episode_bit(episode), watched))
+        elif "season" in change:
+            season = int(change["season"])
+            check_episode(episode_counts, season)
+            all_masks = season_masks(get_episodes_for_tv_show(tmdb_id, [season]))
+            masks.append((season, all_masks.get(season, 0), watched))
+        else:
+            raise ValueError("each change needs season, episode or through")
+    return masks
+
+# Title Detail - Bulk episode watched changes (JSON)
+@app.route("/api/episodes/watched", methods=["POST"])
+@login_required
+def update_watched_episodes():
+    """
+    Apply many episode watched changes for one show in one transaction.
+    Body: {"tmdb_id": 1399, "changes": [...]} (see expand_episode_changes).
+    Returns the resulting states so the page can update its checkboxes.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        tmdb_id = int(data["tmdb_id"])
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid request: {e}"}), 400
+
+    show = get_title_data(tmdb_id, "tv")
+    if show is None:
+        return jsonify({"status": "error", "message": "Show not found"}), 404
+    seasons = show_seasons(show)
+
+    try:
+        changes = expand_episode_changes(
+            tmdb_id, data.get("changes", []), {season["season"]: season["episode_count"] for season in seasons}
+        )
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid request: {e}"}), 400
+
+    try:
+        db = get_db()
+        masks = apply_masks(db, current_user.id, tmdb_id, changes)
+        db.commit()
+
+        # Report the final state of every episode a change touched
+        touched = {}
+        for season, mask, _ in changes:
+            touched[season] = touched.get(season, 0) | mask
+
+        return jsonify({
+            "status": "success",
+            "progress": show_progress(db, current_user.id, tmdb_id, seasons),
+            "episodes": [
+                {"season": season, "episode": episode, "watched": bool(masks[season] & episode_bit(episode))}
+                for season in sorted(touched)
+                for episode in mask_episodes(touched[season])
+            ]
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Watchlist Ranking Feature
+@app.route("/title/<int:title_id>/rank", methods=["POST"])
+@login_required
+def rank_title_realtime(title_id):
+    """
+    Change title rank from Watchlist Page.
+    """
+    db = get_db()
+    rank = request.form.get("rank")
+    media_type = (request.form.get("media_type") or "movie").strip().lower()
+    media_type = "show" if media_type in ("tv", "show") else "movie"
+    user_id = current_user.id
+
+    if not rank:
+        return jsonify({"status": "error", "message": "No rank provided"}), 400
+
+    existing = db.execute("""
+        SELECT * FROM user_ratings
+        WHERE user_id = ? AND tmdb_id = ?
+    """, (user_id, title_id)).fetchone()
+
+    if existing:
+        media_type = existing["media_type"] or media_type
+
+    # Fetch the catalog row before writing, so no TMDb call holds the write lock
+    save_titles(db, [(title_id, media_type)])
+    if existing:
+        db.execute("""
+            UPDATE user_ratings
+            SET rank = ?
+            WHERE user_id = ? AND tmdb_id = ?
+        """, (rank, user_id, title_id))
+    else:
+        db.execute("""
+            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type)
+            VALUES (?, ?, ?, ?)
+        """, (user_id, title_id, rank, media_type))
+
+    bump_ratings_version(db, user_id)
+    db.commit()
+    return jsonify({"status": "success"})
+
+# Top 10 Feature
+@app.route("/top10")
+@login_required
+def top10_page():
+    """
+    Render the Top 10 selection page with draggable lists.
+    """
+    db = get_db()
+    user_id = current_user.id
+
+    # Filmes
+    movies_rows = db.execute(f"""
+        SELECT r.tmdb_id, r.media_type, {CATALOG_COLUMNS}
+        FROM user_ratings r {CATALOG_JOIN}
+        WHERE r.user_id = ? AND r.media_type = 'movie' AND r.top10_position IS NOT NULL
+        ORDER BY r.top10_position
+    """, (user_id,)).fetchall()
+
+    # Séries
+    shows_rows = db.execute(f"""
+        SELECT r.tmdb_id, r.media_type, {CATALOG_COLUMNS}
+        FROM user_ratings r {CATALOG_JOIN}
+        WHERE r.user_id = ? AND r.media_type = 'show' AND r.top10_position IS NOT NULL
+        ORDER BY r.top10_position
+    """, (user_id,)).fetchall()
+
+    # Detalhes de cada título vêm do catálogo local (tabela titles)
+    movies = details_from_rows(db, movies_rows)
+    shows = details_from_rows(db, shows_rows)
+
+    # Monta lista para renderização com nome e poster
+    def format_title(t):
+        return {
+            "id": t["id"],
+            "name": t["name"],
+            "poster_url": image_url(t["poster_path"], "thumb", placeholder=True)
+        }
+
+    movies = [format_title(m) for m in movies]
+    shows = [format_title(s) for s in shows]
+
+    return render_template("top10.html", movies=movies, shows=shows)
+
+# Top 10 Feature - Save Rankings
+@app.route("/top10/save", methods=["POST"])
+@login_required
+def save_top10():
+    """
+    Save the ordering of Top 10 movies and shows
+    for the current user. Only positions that differ from the stored
+    order are written, in one transaction.
+    Returns the user's ratings version after the save.
+    """
+    db = get_db()
+    user_id = current_user.id
+    data = request.get_json()
+
+    # Submitted order: tmdb_id -> (media_type, position), first occurrence wins
+    submitted = {}
+    try:
+        for media_type, key in (("movie", "movies"), ("show", "shows")):
+            position = 0
+            for tmdb_id in data.get(key, []):
+                tmdb_id = int(tmdb_id)
+                if tmdb_id in submitted:
+                    continue
+                position += 1
+                submitted[tmdb_id] = (media_type, position)
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Invalid Top 10 lists"}), 400
+
+    # Stored order
+    stored = {
+        row["tmdb_id"]: row["top10_position"]
+        for row in db.execute("""
+            SELECT tmdb_id, top10_position FROM user_ratings
+            WHERE user_id = ? AND top10_position IS NOT NULL
+        """, (user_id,))
+    }
+
+    removed = [(user_id, tmdb_id) for tmdb_id in stored if tmdb_id not in submitted]
+    changed = [
+        (user_id, tmdb_id, media_type, position)
+        for tmdb_id, (media_type, position) in submitted.items()
+        if stored.get(tmdb_id) != position
+    ]
+
+    if removed or changed:
+        # Make sure every newly placed title is in the local catalog. Fetched
+        # before the writes below, so no TMDb call holds the write lock
+        save_titles(db, [(tmdb_id, media_type) for _, tmdb_id, media_type, _ in changed])
+        db.executemany("""
+            UPDATE user_ratings
+            SET top10_position = NULL
+            WHERE user_id = ? AND tmdb_id = ?
+        """, removed)
+
+        db.executemany("""
+            INSERT INTO user_ratings (user_id, tmdb_id, rank, media_type, top10_position)
+            VALUES (?, ?, NULL, ?, ?)
+            ON CONFLICT(user_id, tmdb_id)
+            DO UPDATE SET top10_position = excluded.top10_position
+        """, changed)
+
+        bump_ratings_version(db, user_id)
+        db.commit()
+
+    return jsonify({
+        "status": "saved",
+        "changed": len(removed) + len(changed),
+        "version": get_ratings_version(db, user_id)
+    })
+
+@app.route("/api/search")
+@login_required
+def api_search():
+    """
+    Search bar on Top 10 Page.
+    """
+    query = request.args.get("q", "")
+    results = search_title(query) if query else []
+
+    # Convert "tv" media type to "show"
+    for item in results:
+        if item["media_type"] == "tv":
+            item["media_type"] = "show"
+
+    return jsonify(results)
+
+# Finder Feature - Load and display a random video from the YouTube playlist
+@app.route("/api/random_video")
+def random_video():
+    """
+    Return JSON of a random video from predefined YouTube playlist.
+    Optional query params:
+    - count: return {"videos": [...]} with up to 10 videos (for prefetching)
+    - no_repeat=1: skip videos already shown in this session
+    """
+    try:
+        if not YOUTUBE_API_KEY:
+            return jsonify({"error": "Missing API key"}), 500
+
+        # Playlist is kept in memory and refreshed in the background
+        if not finder_playlist.get_videos():
+            return jsonify({"error": "No videos found"}), 404
+
+        count = request.args.get("count", type=int)
+        no_repeat = request.args.get("no_repeat") == "1"
+        seen = session.get("seen_videos", []) if no_repeat else []
+
+        videos = finder_playlist.pick(max(1, min(count or 1, 10)), exclude=seen)
+
+        if no_repeat:
+            # Remember recent picks; start over once most of the list was shown
+            seen = seen + [video["videoId"] for video in videos]
+            if len(seen) >= len(finder_playlist.videos) - 1:
+                seen = [video["videoId"] for video in videos]
+            session["seen_videos"] = seen[-SEEN_VIDEOS_LIMIT:]
+
+        if count:
+            return jsonify({"videos": videos})
+        return jsonify(videos[0])
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Finder Feature
+@app.route("/finder")
+def finder_page():
+    """
+    Render the finder page for random video lookup.
+    """
+    return render_template("finder.html")
+
+# Metrics (Prometheus text format, summed over all workers when METRICS_DIR is set)
+@app.route("/metrics")
+def metrics_page():
+    """
+    Per-endpoint request counts and latency, upstream TMDb/YouTube calls,
+    SQL statements and cache hit ratios.
+    Requires METRICS_TOKEN as a bearer token; without one configured only
+    loopback requests that did not pass through a proxy are answered.
+    """
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            return "Unauthorized", 401
+    elif request.remote_addr not in ("127.0.0.1", "::1") or "X-Forwarded-For" in request.headers:
+        return "Forbidden", 403
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# CLI - Background cache refresher
+@app.cli.command("refresh-cache")
+@click.option("--once", is_flag=True, help="Run a single refresh pass and exit.")
+def refresh_cache_command(once):
+    """
+    Refresh cached TMDb entries nearing expiry, most viewed first,
+    within the TMDB_REFRESH_BUDGET requests per minute.
+    """
+    if once:
+        count = refresher.run_once(scan=True)
+        click.echo(f"Refreshed {count} cache entries.")
+    else:
+        click.echo("Refreshing cache entries (Ctrl+C to stop)...")
+        refresher.run_forever(scan=True)
+
+# CLI - Static asset build
+@app.cli.command("build-assets")
+def build_assets_command():
+    """
+    Rebuild fingerprinted CSS/JS, their .gz/.br variants and the avatar
+    thumbnails and sprite (also done at startup when sources change).
+    """
+    asset_manifest.build()
+    click.echo(f"Built {len(asset_manifest.files)} assets and {len(asset_manifest.avatars)} avatars into {asset_manifest.build_dir}.")
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port, debug=True)
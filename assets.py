@@ -0,0 +1,246 @@
+# assets.py
+"""
+Fingerprinted static assets and the avatar manifest.
+At startup (or with `flask build-assets`) the CSS and JS under static/ are
+copied into ASSET_BUILD_DIR under content-hashed names, each with a .gz
+(and, when brotli is installed, .br) variant, so /assets can serve them
+with immutable caching. The avatar folder is listed once; with Pillow
+installed every avatar also gets a small thumbnail and all of them are
+packed into one sprite sheet for the avatar pickers. The result is kept
+in manifest.json and reused until a source file changes.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+from werkzeug.security import safe_join
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features  # Optional: pip install Pillow
+except ImportError:
+    Image = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+ASSET_BUILD_DIR = os.getenv("ASSET_BUILD_DIR", os.path.join(BASE_DIR, "asset_build"))
+ASSET_URL_PREFIX = "/assets"
+# Seconds browsers may keep a built asset (content-hashed, so never changes)
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+# Folders under static/ whose files are fingerprinted and precompressed
+FINGERPRINT_DIRS = ("css", "js")
+AVATAR_DIR = os.path.join("images", "avatars")
+AVATAR_EXTENSIONS = (".png", ".jpg")
+DEFAULT_AVATAR = "avatar_default.png"
+# Pixel size of avatar thumbnails and sprite tiles, and sprite columns
+AVATAR_THUMB_SIZE = int(os.getenv("AVATAR_THUMB_SIZE", 128))
+SPRITE_COLUMNS = 10
+
+# Absolute /static/... references inside CSS (e.g. @import url("/static/css/layout.css"))
+_STATIC_REF = re.compile(r"/static/([\w./-]+)")
+
+
+def _content_name(rel_path, data):
+    """
+    "css/styles.css" -> "css/styles.<hash>.css"
+    """
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{hashlib.sha1(data).hexdigest()[:12]}{ext}"
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class AssetManifest:
+    """
+    Maps static file names to their built copies and lists the avatars.
+    files: {"css/styles.css": "css/styles.<hash>.css", "images/avatars/x.png": "avatars/x.<hash>.webp"}
+    avatars: [{"name", "url", "position"}, ...] (position is None without a sprite)
+    sprite: {"url", "size"} or None
+    """
+    def __init__(self, static_dir=STATIC_DIR, build_dir=ASSET_BUILD_DIR):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.files = {}
+        self.avatars = []
+        self.avatar_names = frozenset()
+        self.sprite = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.build_dir, "manifest.json")
+
+    def _sources(self):
+        """
+        Source files the build depends on, relative to static/, sorted.
+        """
+        sources = []
+        for folder in FINGERPRINT_DIRS:
+            for root, _, names in os.walk(os.path.join(self.static_dir, folder)):
+                for name in names:
+                    sources.append(os.path.relpath(os.path.join(root, name), self.static_dir).replace(os.sep, "/"))
+        for name in os.listdir(os.path.join(self.static_dir, AVATAR_DIR)):
+            if name.lower().endswith(AVATAR_EXTENSIONS):
+                sources.append(f"images/avatars/{name}")
+        return sorted(sources)
+
+    def _signature(self, sources):
+        """
+        Hash of every source's size and mtime plus the build options, so a
+        changed file or a newly installed optional package triggers a rebuild.
+        """
+        digest = hashlib.sha1(f"{AVATAR_THUMB_SIZE}:{Image is not None}:{brotli is not None}".encode("utf-8"))
+        for rel_path in sources:
+            stat = os.stat(os.path.join(self.static_dir, rel_path))
+            digest.update(f"{rel_path}:{stat.st_size}:{stat.st_mtime_ns}\0".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _apply(self, manifest):
+        self.files = manifest["files"]
+        self.avatars = manifest["avatars"]
+        self.avatar_names = frozenset(avatar["name"] for avatar in self.avatars)
+        self.sprite = manifest["sprite"]
+
+    def load(self):
+        """
+        Use the existing manifest if it matches the sources, otherwise build.
+        """
+        sources = self._sources()
+        signature = self._signature(sources)
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("signature") == signature:
+                self._apply(manifest)
+                return
+        except (OSError, ValueError):
+            pass
+        self.build(sources, signature)
+
+    def build(self, sources=None, signature=None):
+        """
+        Write fingerprinted, precompressed CSS/JS and the avatar thumbnails
+        and sprite, then save the manifest. Safe to run from several workers
+        at once: every file is written atomically under a content-hashed name.
+        """
+        if sources is None:
+            sources = self._sources()
+            signature = self._signature(sources)
+
+        files = {}
+        code = [path for path in sources if not path.startswith("images/")]
+        # Files without /static/ references first, so imports can be rewritten
+        for rel_path in sorted(code, key=lambda path: self._references_static(path)):
+            files[rel_path] = self._build_file(rel_path, files)
+
+        avatar_names = [path.rsplit("/", 1)[1] for path in sources if path.startswith("images/avatars/")]
+        avatars, sprite = self._build_avatars(avatar_names, files)
+
+        manifest = {"signature": signature, "files": files, "avatars": avatars, "sprite": sprite}
+        _write_atomic(self.manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+        self._apply(manifest)
+
+    def _references_static(self, rel_path):
+        with open(os.path.join(self.static_dir, rel_path), "rb") as f:
+            return b"/static/" in f.read()
+
+    def _build_file(self, rel_path, files):
+        """
+        Copy one CSS/JS file to its hashed name with .gz/.br variants.
+        /static/ references to already built files point at the built copy.
+        """
+        with open(os.path.join(self.static_dir, rel_path), "rb") as f:
+            data = f.read()
+        if rel_path.endswith(".css"):
+            text = data.decode("utf-8")
+            text = _STATIC_REF.sub(lambda m: f"{ASSET_URL_PREFIX}/{files[m.group(1)]}" if m.group(1) in files else m.group(0), text)
+            data = text.encode("utf-8")
+
+        built = _content_name(rel_path, data)
+        path = os.path.join(self.build_dir, built)
+        if not os.path.exists(path):
+            _write_atomic(f"{path}.gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli:
+                _write_atomic(f"{path}.br", brotli.compress(data, quality=11))
+            _write_atomic(path, data)
+        return built
+
+    def _build_avatars(self, names, files):
+        """
+        Build the avatar list. With Pillow, add a thumbnail per avatar (also
+        registered in files) and one sprite sheet with every avatar as a tile.
+        """
+        if Image is None:
+            return [{"name": name, "url": f"/static/images/avatars/{name}", "position": None} for name in names], None
+
+        size = AVATAR_THUMB_SIZE
+        fmt, ext = ("WEBP", "webp") if features.check("webp") else ("PNG", "png")
+        columns = min(SPRITE_COLUMNS, len(names)) or 1
+        rows = (len(names) + columns - 1) // columns or 1
+        sheet = Image.new("RGBA", (columns * size, rows * size), (0, 0, 0, 0))
+
+        avatars = []
+        for index, name in enumerate(names):
+            with Image.open(os.path.join(self.static_dir, AVATAR_DIR, name)) as image:
+                tile = image.convert("RGBA")
+                tile.thumbnail((size, size), Image.LANCZOS)
+            column, row = index % columns, index // columns
+            sheet.paste(tile, (column * size + (size - tile.width) // 2, row * size + (size - tile.height) // 2))
+
+            thumb = self._save_image(tile, f"avatars/{os.path.splitext(name)[0]}.{ext}", fmt)
+            files[f"images/avatars/{name}"] = thumb
+            # Percent positions keep working at any displayed size
+            x = column * 100 / (columns - 1) if columns > 1 else 0
+            y = row * 100 / (rows - 1) if rows > 1 else 0
+            avatars.append({"name": name, "url": f"{ASSET_URL_PREFIX}/{thumb}", "position": f"{x:g}% {y:g}%"})
+
+        sprite = self._save_image(sheet, f"avatars/sprite.{ext}", fmt)
+        return avatars, {"url": f"{ASSET_URL_PREFIX}/{sprite}", "size": f"{columns * 100}% {rows * 100}%"}
+
+    def _save_image(self, image, rel_path, fmt):
+        out = io.BytesIO()
+        if fmt == "WEBP":
+            image.save(out, fmt, quality=85, method=6)
+        else:
+            image.save(out, fmt, optimize=True)
+        data = out.getvalue()
+        built = _content_name(rel_path, data)
+        path = os.path.join(self.build_dir, built)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        return built
+
+    def lookup(self, filename):
+        """
+        Built path for a static filename, or None if it is not fingerprinted.
+        """
+        return self.files.get(filename)
+
+    def precompressed(self, filename, accept_encodings):
+        """
+        Return (path, content coding) of the best precompressed variant of a
+        built file the client accepts, or (path, None) for the plain file.
+        Returns (None, None) for names outside the build folder.
+        """
+        path = safe_join(self.build_dir, filename)
+        if path is None:
+            return None, None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if accept_encodings[encoding] and os.path.exists(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+
+# Shared manifest, built or loaded once when the app starts
+asset_manifest = AssetManifest()
+asset_manifest.load()
@@ -0,0 +1,8 @@
+# bench/__init__.py
+"""
+Reproducible benchmark suite: a local stub for TMDb and YouTube
+(fake_upstream.py), a database seeder (seed.py), a concurrent load
+generator (loadgen.py) and run.py, which wires them together and writes
+the latency/throughput report as JSON. Run from the repository root:
+    python -m bench.run --output bench_output.json
+"""
@@ -0,0 +1,246 @@
+# bench/fake_upstream.py
+"""
+Local stand-in for the TMDb API, the TMDb image host and the YouTube
+Data API. Responses are built from the recorded payloads in
+bench/fixtures with the requested id filled in, so any title id works.
+Every response can be delayed (latency plus random jitter) and a share
+of them fail with 500 or 429, to see how the app behaves when upstream
+is slow or flaky.
+    TMDB_BASE_URL   = http://host:port/3
+    TMDB_IMAGE_URL  = http://host:port/t/p
+    YOUTUBE_API_URL = http://host:port/youtube/v3
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Ids used for list, search and playlist entries
+LIST_SIZE = 20
+PLAYLIST_SIZE = 200
+PLAYLIST_PAGE_SIZE = 50
+
+
+def load_fixtures():
+    """
+    Read every fixture into {name: payload}, plus the genre lists and a
+    small image for the /t/p image host.
+    """
+    fixtures = {}
+    for name in os.listdir(FIXTURES_DIR):
+        if name.endswith(".json"):
+            with open(os.path.join(FIXTURES_DIR, name), "r") as f:
+                fixtures[name[:-5]] = json.load(f)
+    with open(os.path.join(ROOT_DIR, "data", "genres.json"), "r") as f:
+        fixtures["genres"] = json.load(f)
+    with open(os.path.join(ROOT_DIR, "static", "images", "placeholder.png"), "rb") as f:
+        fixtures["image"] = f.read()
+    return fixtures
+
+
+class FakeUpstream:
+    """
+    Builds stub responses: (status, content type, body bytes).
+    latency and jitter are in seconds, error_rate is a 0-1 share of
+    requests answered with an error instead.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, title_count=1000, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.title_count = title_count
+        self.fixtures = load_fixtures()
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _delay_and_fail(self):
+        """
+        Sleep for this response's latency; return True if it should fail.
+        """
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+    def _ids(self, key, count):
+        # Stable pseudo-random ids per list, so repeated calls return the same page
+        rng = random.Random(key)
+        return [rng.randint(1, self.title_count) for _ in range(count)]
+
+    def _movie(self, tmdb_id):
+        data = copy.deepcopy(self.fixtures["movie"])
+        data.update(id=tmdb_id, title=f"Bench Movie {tmdb_id}", original_title=f"Bench Movie {tmdb_id}")
+        return data
+
+    def _season(self, tmdb_id, season_number):
+        show = self.fixtures["tv"]
+        info = next((s for s in show["seasons"] if s["season_number"] == season_number), None)
+        if info is None:
+            return None
+        template = self.fixtures["season"]["episodes"][0]
+        data = copy.deepcopy(self.fixtures["season"])
+        data.update(id=tmdb_id * 100 + season_number, name=info["name"], season_number=season_number, air_date=info["air_date"])
+        data["episodes"] = [
+            dict(template, episode_number=n, season_number=season_number, name=f"Episode {n}", air_date=info["air_date"])
+            for n in range(1, info["episode_count"] + 1)
+        ]
+        return data
+
+    def _tv(self, tmdb_id, append):
+        data = copy.deepcopy(self.fixtures["tv"])
+        data.update(id=tmdb_id, name=f"Bench Show {tmdb_id}", original_name=f"Bench Show {tmdb_id}")
+        for item in append:
+            match = re.fullmatch(r"season/(\d+)", item)
+            if match:
+                season = self._season(tmdb_id, int(match.group(1)))
+                if season:
+                    data[item] = season
+        return data
+
+    def _list(self, key, page):
+        data = copy.deepcopy(self.fixtures["list"])
+        template = data["results"][0]
+        data["page"] = page
+        data["results"] = [
+            dict(template, id=tmdb_id, title=f"Bench Title {tmdb_id}", name=f"Bench Title {tmdb_id}")
+            for tmdb_id in self._ids(f"{key}:{page}", LIST_SIZE)
+        ]
+        return data
+
+    def _search(self, query):
+        data = copy.deepcopy(self.fixtures["search"])
+        for item, tmdb_id in zip(data["results"], self._ids(f"search:{query}", len(data["results"]))):
+            item["id"] = tmdb_id
+        return data
+
+    def _playlist(self, page_token):
+        data = copy.deepcopy(self.fixtures["playlist"])
+        template = data["items"][0]
+        start = int(page_token or 0)
+        data["items"] = []
+        for n in range(start, min(start + PLAYLIST_PAGE_SIZE, PLAYLIST_SIZE)):
+            item = copy.deepcopy(template)
+            item["snippet"]["title"] = f"Bench Video {n}"
+            item["snippet"]["resourceId"]["videoId"] = f"bench{n:06d}"
+            data["items"].append(item)
+        if start + PLAYLIST_PAGE_SIZE < PLAYLIST_SIZE:
+            data["nextPageToken"] = str(start + PLAYLIST_PAGE_SIZE)
+        return data
+
+    def respond(self, url):
+        """
+        Return (status, content type, body) for a GET of url.
+        """
+        parsed = urlparse(url)
+        path = parsed.path
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+
+        if self._delay_and_fail():
+            status = self.random.choice((500, 429))
+            return status, "application/json", json.dumps({"status_message": "Injected failure"}).encode("utf-8")
+
+        if path.startswith("/t/p/"):
+            return 200, "image/png", self.fixtures["image"]
+
+        data = None
+        if path == "/youtube/v3/playlistItems":
+            data = self._playlist(params.get("pageToken"))
+        elif path.startswith("/3/"):
+            path = path[2:]
+            match = re.fullmatch(r"/(movie|tv)/(\d+)", path)
+            season = re.fullmatch(r"/tv/(\d+)/season/(\d+)", path)
+            genres = re.fullmatch(r"/genre/(movie|tv)/list", path)
+            if match and match.group(1) == "movie":
+                data = self._movie(int(match.group(2)))
+            elif match:
+                append = [item for item in params.get("append_to_response", "").split(",") if item]
+                data = self._tv(int(match.group(2)), append)
+            elif season:
+                data = self._season(int(season.group(1)), int(season.group(2)))
+            elif genres:
+                data = {"genres": self.fixtures["genres"][genres.group(1)]}
+            elif path == "/search/multi":
+                data = self._search(params.get("query", ""))
+            elif re.fullmatch(r"/(movie|tv|discover|trending)/[\w/]+", path):
+                data = self._list(path + params.get("with_genres", ""), int(params.get("page", 1)))
+
+        if data is None:
+            return 404, "application/json", json.dumps({"status_message": "Not found"}).encode("utf-8")
+        return 200, "application/json", json.dumps(data).encode("utf-8")
+
+
+def make_handler(upstream):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            status, content_type, body = upstream.respond(self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_server(upstream, host="127.0.0.1", port=0):
+    """
+    Serve upstream on a background thread. Returns the server; its
+    address is server.server_address and server.shutdown() stops it.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(upstream))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-upstream", daemon=True).start()
+    return server
+
+def base_urls(server):
+    """
+    Environment variables that point the app at server.
+    """
+    host, port = server.server_address[:2]
+    root = f"http://{host}:{port}"
+    return {
+        "TMDB_BASE_URL": f"{root}/3",
+        "TMDB_IMAGE_URL": f"{root}/t/p",
+        "YOUTUBE_API_URL": f"{root}/youtube/v3",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve stub TMDb and YouTube responses.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Base delay added to every response.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random delay, up to this much.")
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of responses (0-1) that fail with 500/429.")
+    parser.add_argument("--titles", type=int, default=1000, help="Ids used in list and search results.")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.titles)
+    server = start_server(upstream, args.host, args.port)
+    for name, value in base_urls(server).items():
+        print(f"{name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
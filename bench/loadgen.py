@@ -0,0 +1,180 @@
+# bench/loadgen.py
+"""
+Concurrent load generator. Each worker thread logs in as one of the
+seeded users and requests a weighted mix of pages until the duration is
+over, then per-route and overall latency percentiles (p50/p95/p99, in
+milliseconds), error counts and throughput are returned as a dict ready
+to dump as JSON.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from urllib.parse import quote
+import requests
+
+# Tiers of the rank page, whose titles are loaded from /api/rank/tier
+RANK_TIERS = [
+    "ABSOLUTE CINEMA", "GREAT", "GOOD", "COULD BE BETTER", "BAD",
+    "WATCHED", "WATCHING", "WATCHLIST"
+]
+
+# (route label, weight, URL builder taking (username, rng, title_count))
+SCENARIO = [
+    ("/", 2, lambda user, rng, titles: "/"),
+    ("/api/tmdb/popular", 1, lambda user, rng, titles: "/api/tmdb/popular"),
+    ("/api/tmdb/now_playing", 1, lambda user, rng, titles: "/api/tmdb/now_playing"),
+    ("/api/tmdb/upcoming", 1, lambda user, rng, titles: "/api/tmdb/upcoming"),
+    ("/api/tmdb/discover", 1, lambda user, rng, titles: f"/api/tmdb/discover?media_type={rng.choice(('movie', 'tv'))}&with_genres={rng.choice((18, 28, 35))}"),
+    ("/rank", 2, lambda user, rng, titles: "/rank"),
+    # The rank page is a skeleton; its first tier pages are requested right after it
+    ("/api/rank/tier", 4, lambda user, rng, titles: f"/api/rank/tier?rank={quote(rng.choice(RANK_TIERS))}"),
+    ("/watchlist", 2, lambda user, rng, titles: "/watchlist"),
+    ("/profile/<u>", 2, lambda user, rng, titles: f"/profile/{user}"),
+    ("/title/<id>", 2, lambda user, rng, titles: f"/title/{rng.randint(1, titles)}?media_type={rng.choice(('movie', 'tv'))}"),
+    ("/top10", 1, lambda user, rng, titles: "/top10"),
+]
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list (None if empty).
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+def summarize(latencies, errors, elapsed):
+    """
+    Stats for one route (or all of them): latencies in seconds.
+    """
+    values = sorted(latencies)
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": to_ms(sum(values) / len(values)) if values else None,
+        "p50_ms": to_ms(percentile(values, 0.50)),
+        "p95_ms": to_ms(percentile(values, 0.95)),
+        "p99_ms": to_ms(percentile(values, 0.99)),
+        "max_ms": to_ms(values[-1]) if values else None,
+    }
+
+
+class LoadGenerator:
+    """
+    Runs `concurrency` threads against base_url for `duration` seconds
+    (after `warmup` seconds whose requests are not recorded).
+    """
+    def __init__(self, base_url, users, password, concurrency=8, duration=30.0, warmup=5.0,
+                 title_count=1000, seed=1, timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.users = users
+        self.password = password
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.title_count = title_count
+        self.seed = seed
+        self.timeout = timeout
+        self.latencies = {label: [] for label, _, _ in SCENARIO}
+        self.errors = {label: 0 for label, _, _ in SCENARIO}
+        self.login_failures = 0
+        self._lock = threading.Lock()
+
+    def _login(self, session, user):
+        response = session.post(f"{self.base_url}/login", data={"username": user, "password": self.password},
+                                allow_redirects=False, timeout=self.timeout)
+        if response.status_code != 302 or "/login" in response.headers.get("Location", ""):
+            raise RuntimeError(f"Login failed for {user} ({response.status_code})")
+
+    def _worker(self, index, record_from, stop_at):
+        rng = random.Random(self.seed * 1000 + index)
+        user = self.users[index % len(self.users)]
+        labels = [label for label, _, _ in SCENARIO]
+        weights = [weight for _, weight, _ in SCENARIO]
+        builders = {label: build for label, _, build in SCENARIO}
+
+        session = requests.Session()
+        try:
+            self._login(session, user)
+        except (requests.RequestException, RuntimeError):
+            with self._lock:
+                self.login_failures += 1
+            return
+        while time.monotonic() < stop_at:
+            label = rng.choices(labels, weights)[0]
+            url = self.base_url + builders[label](user, rng, self.title_count)
+            start = time.monotonic()
+            try:
+                response = session.get(url, timeout=self.timeout)
+                response.content
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            elapsed = time.monotonic() - start
+            if start < record_from:
+                continue
+            with self._lock:
+                self.latencies[label].append(elapsed)
+                if failed:
+                    self.errors[label] += 1
+
+    def run(self):
+        """
+        Run the load and return the report dict.
+        """
+        started = time.monotonic()
+        record_from = started + self.warmup
+        stop_at = record_from + self.duration
+        threads = [
+            threading.Thread(target=self._worker, args=(n, record_from, stop_at), name=f"load-{n}")
+            for n in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = max(time.monotonic() - record_from, 0.001)
+
+        everything = [value for values in self.latencies.values() for value in values]
+        return {
+            "config": {
+                "base_url": self.base_url,
+                "concurrency": self.concurrency,
+                "duration_s": self.duration,
+                "warmup_s": self.warmup,
+                "users": len(self.users),
+                "seed": self.seed,
+            },
+            "login_failures": self.login_failures,
+            "overall": summarize(everything, sum(self.errors.values()), elapsed),
+            "routes": {
+                label: summarize(self.latencies[label], self.errors[label], elapsed)
+                for label, _, _ in SCENARIO
+            },
+        }
+
+
+if __name__ == "__main__":
+    from bench.seed import BENCH_PASSWORD, username
+
+    parser = argparse.ArgumentParser(description="Drive a running app with the benchmark request mix.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--users", type=int, default=50, help="Seeded users to log in as.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--titles", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    generator = LoadGenerator(
+        args.url, [username(n) for n in range(1, args.users + 1)], BENCH_PASSWORD,
+        args.concurrency, args.duration, args.warmup, args.titles, args.seed
+    )
+    print(json.dumps(generator.run(), indent=2))
@@ -0,0 +1,185 @@
+# bench/run.py
+"""
+One-command benchmark: start the stub upstream, seed a database in a
+scratch directory, start the app against both (gunicorn when installed,
+otherwise the Flask server), run the load generator and write a JSON
+report with latency percentiles, throughput, upstream call counts per
+endpoint (from /metrics) and the commit it ran on.
+    python -m bench.run --users 50 --ratings 200 --episodes 100 \
+        --concurrency 8 --duration 30 --latency-ms 80 --output bench_output.json
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import requests
+from bench.fake_upstream import FakeUpstream, start_server, base_urls
+from bench.loadgen import LoadGenerator
+from bench.seed import BENCH_PASSWORD, seed, username
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds to wait for the app to answer after starting it
+STARTUP_TIMEOUT = 60
+
+# Per-endpoint counters copied from /metrics into the report
+_METRIC_LINE = re.compile(r'^(app_upstream_requests_total|app_upstream_seconds_total|app_sql_statements_total|app_sql_seconds_total)\{([^}]*)\} (\S+)$')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def start_app(port, env, server, workers, log_path):
+    """
+    Start the app on port, logging to log_path, and return the process.
+    """
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", "4",
+                   "-b", f"127.0.0.1:{port}", "app:app"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--no-reload", "--no-debugger"]
+    with open(log_path, "wb") as log:
+        return subprocess.Popen(command, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_until_ready(base_url, process, log_path):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path, "r", errors="replace") as f:
+                raise RuntimeError(f"App exited during startup:\n{f.read()}")
+        try:
+            if requests.get(f"{base_url}/login", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("App did not start in time")
+
+def endpoint_metrics(base_url):
+    """
+    {endpoint: {metric: value}} for the upstream and SQL counters.
+    """
+    try:
+        text = requests.get(f"{base_url}/metrics", timeout=10).text
+    except requests.RequestException:
+        return {}
+    endpoints = {}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if not match:
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        name = match.group(1).replace("app_", "")
+        if "service" in labels:
+            name = f"{labels['service']}_{name.replace('upstream_', '')}"
+        entry = endpoints.setdefault(labels["endpoint"], {})
+        entry[name] = round(entry.get(name, 0) + float(match.group(3)), 6)
+    return endpoints
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write a JSON report.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ratings", type=int, default=200, help="Ratings per user.")
+    parser.add_argument("--episodes", type=int, default=100, help="Watched episodes per user.")
+    parser.add_argument("--titles", type=int, default=1000, help="Range of TMDb ids used.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub upstream base latency.")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="Stub upstream random extra latency.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub responses that fail.")
+    parser.add_argument("--server", choices=("auto", "gunicorn", "flask"), default="auto")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", help="Keep databases and caches here instead of a temp directory.")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout).")
+    args = parser.parse_args()
+
+    server_kind = args.server
+    if server_kind == "auto":
+        server_kind = "gunicorn" if shutil.which("gunicorn") else "flask"
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="2watch-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    upstream = FakeUpstream(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.titles, args.seed)
+    upstream_server = start_server(upstream)
+
+    database = os.path.join(workdir, "database.db")
+    seed(database, args.users, args.ratings, args.episodes, args.titles, args.seed, log=lambda message: print(message, file=sys.stderr))
+    cache_path = os.path.join(workdir, "cache.db")
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    metrics_dir = os.path.join(workdir, "metrics")
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, **base_urls(upstream_server))
+    env.update({
+        "DATABASE_PATH": database,
+        "TMDB_CACHE_PATH": cache_path,
+        "IMAGE_CACHE_DIR": os.path.join(workdir, "image_cache"),
+        "ASSET_BUILD_DIR": os.path.join(workdir, "asset_build"),
+        "METRICS_DIR": metrics_dir,
+        "METRICS_FLUSH_INTERVAL": "1",
+        "SECRET_KEY": env.get("SECRET_KEY") or "bench",
+        "TMDB_API_KEY": "bench",
+        "YOUTUBE_API_KEY": "bench",
+    })
+    env.pop("METRICS_TOKEN", None)
+
+    log_path = os.path.join(workdir, "app.log")
+    process = start_app(port, env, server_kind, args.workers, log_path)
+    try:
+        wait_until_ready(base_url, process, log_path)
+        generator = LoadGenerator(
+            base_url, [username(n) for n in range(1, args.users + 1)], BENCH_PASSWORD,
+            args.concurrency, args.duration, args.warmup, args.titles, args.seed
+        )
+        report = generator.run()
+        # Summed from the workers' metric files, which are written at most once
+        # a second, so other workers' last second of requests may be missing
+        report["endpoints"] = endpoint_metrics(base_url)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        upstream_server.shutdown()
+
+    report["commit"] = git_commit()
+    report["timestamp"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    report["config"].update({
+        "server": server_kind,
+        "workers": args.workers if server_kind == "gunicorn" else 1,
+        "ratings_per_user": args.ratings,
+        "episodes_per_user": args.episodes,
+        "titles": args.titles,
+        "upstream_latency_ms": args.latency_ms,
+        "upstream_jitter_ms": args.jitter_ms,
+        "upstream_error_rate": args.error_rate,
+    })
+    report["upstream"] = {"requests": upstream.requests, "errors": upstream.errors}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# bench/seed.py
+"""
+Seed a fresh database for benchmarking: N users (bench0001, bench0002,
+... all with password "bench"), M ratings each spread over every rank
+with Top 10 positions, and K watched episodes each on their shows. Ids
+and ranks come from a seeded random generator, so the same arguments
+always produce the same database.
+"""
+import argparse
+import os
+import random
+from werkzeug.security import generate_password_hash
+from db import get_db_connection
+from migrations import migrate
+from watched import mask_to_blob
+
+BENCH_PASSWORD = "bench"
+RANKS = [
+    "ABSOLUTE CINEMA", "GREAT", "GOOD", "COULD BE BETTER", "BAD",
+    "WATCHED", "WATCHING", "WATCHLIST", "DIDN'T WATCH", "NOT INTERESTED"
+]
+# Episodes per season of the stub show (bench/fixtures/tv.json)
+SEASON_EPISODES = [7, 13, 13, 13, 16]
+
+
+def username(n):
+    return f"bench{n:04d}"
+
+def watched_rows(user_id, show_ids, episodes):
+    """
+    Mark episodes watched in order (S1E1, S1E2, ...) across the user's
+    shows. Returns user_season_watched rows.
+    """
+    rows = []
+    for tmdb_id in show_ids:
+        for season, count in enumerate(SEASON_EPISODES, start=1):
+            if episodes <= 0:
+                return rows
+            take = min(count, episodes)
+            rows.append((user_id, tmdb_id, season, mask_to_blob((1 << take) - 1)))
+            episodes -= take
+    return rows
+
+def seed(path, users, ratings, episodes, title_count=1000, random_seed=1, log=print):
+    """
+    Create the database at path (replacing any existing file) and fill it.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    conn = get_db_connection(path)
+    migrate(conn, log=lambda message: None)
+    rng = random.Random(random_seed)
+    password = generate_password_hash(BENCH_PASSWORD)
+    ratings = min(ratings, title_count)
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (username, password) VALUES (?, ?)",
+            [(username(n), password) for n in range(1, users + 1)]
+        )
+        for user_id in range(1, users + 1):
+            rows = []
+            top10 = {"movie": 0, "show": 0}
+            show_ids = []
+            for n, tmdb_id in enumerate(rng.sample(range(1, title_count + 1), ratings)):
+                media_type = rng.choice(("movie", "show"))
+                rank = rng.choice(RANKS)
+                position = None
+                if rank in ("ABSOLUTE CINEMA", "GREAT") and top10[media_type] < 10:
+                    top10[media_type] += 1
+                    position = top10[media_type]
+                if media_type == "show" and rank not in ("WATCHLIST", "DIDN'T WATCH", "NOT INTERESTED"):
+                    show_ids.append(tmdb_id)
+                # One second apart, so list order by created is stable
+                rows.append((user_id, tmdb_id, media_type, rank, position, f"+{n} seconds"))
+
+            conn.executemany("""
+                INSERT INTO user_ratings (user_id, tmdb_id, media_type, rank, top10_position, created)
+                VALUES (?, ?, ?, ?, ?, datetime('2024-01-01', ?))
+            """, rows)
+            conn.executemany(
+                "INSERT INTO user_season_watched (user_id, tmdb_id, season, bits) VALUES (?, ?, ?, ?)",
+                watched_rows(user_id, show_ids, episodes)
+            )
+    conn.close()
+    log(f"Seeded {path}: {users} users x {ratings} ratings x {episodes} watched episodes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create a seeded benchmark database.")
+    parser.add_argument("--db", default="bench_database.db", help="Database file to (re)create.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ratings", type=int, default=200, help="Ratings per user.")
+    parser.add_argument("--episodes", type=int, default=100, help="Watched episodes per user.")
+    parser.add_argument("--titles", type=int, default=1000, help="Range of TMDb ids to rate.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    seed(args.db, args.users, args.ratings, args.episodes, args.titles, args.seed)
@@ -0,0 +1,198 @@
+# cache.py
+"""
+Persistent cache helper.
+Provides a small key/value cache stored in SQLite so cached TMDb data
+survives app restarts. Entries expire after a per-entry TTL and the
+least recently used entries are evicted once the size cap is reached.
+Expired entries can still be read as stale values (up to max_stale
+seconds past expiry) while the refresher re-fetches them.
+Reads do not write: access times and read counts are kept in memory and
+written in batches, together with size-cap eviction.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from metrics import record_cache
+
+# Default location of the cache database (separate from the app database)
+CACHE_PATH = os.getenv("TMDB_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.db"))
+CACHE_MAX_ENTRIES = int(os.getenv("TMDB_CACHE_MAX_ENTRIES", 20000))
+CACHE_TTL = int(os.getenv("TMDB_CACHE_TTL", 24 * 60 * 60))
+CACHE_MAX_STALE = int(os.getenv("TMDB_CACHE_MAX_STALE", 7 * 24 * 60 * 60))
+# Pending access updates are written after this many seconds or this many
+# touched keys and writes, whichever comes first
+CACHE_FLUSH_INTERVAL = float(os.getenv("TMDB_CACHE_FLUSH_INTERVAL", 30))
+CACHE_FLUSH_SIZE = int(os.getenv("TMDB_CACHE_FLUSH_SIZE", 500))
+
+
+class SQLiteCache:
+    """
+    Key/value cache persisted to a SQLite table.
+    Values are stored as JSON. Each entry has its own expiry time, a
+    last access time used for LRU eviction under max_entries and a read
+    counter used to refresh the most viewed entries first. Both are
+    buffered per process and written by flush(), so the size cap is
+    enforced at flush time and may be briefly exceeded.
+    """
+    def __init__(self, path=CACHE_PATH, table="cache", max_entries=CACHE_MAX_ENTRIES, default_ttl=CACHE_TTL, max_stale=CACHE_MAX_STALE):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._conn = None
+        # key -> [last access time, reads not yet written]
+        self._access = {}
+        self._writes = 0
+        self._flushed_at = time.monotonic()
+
+    def _connect(self):
+        """
+        Open the cache connection on first use and create the table.
+        """
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Older cache files were created without hit_count
+            columns = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+            if "hit_count" not in columns:
+                conn.execute(f"ALTER TABLE {self.table} ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_access ON {self.table}(last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key):
+        """
+        Return the cached value for key, or None if missing or expired.
+        """
+        value, stale = self.get_entry(key)
+        return None if stale else value
+
+    def get_entry(self, key):
+        """
+        Return (value, stale) for key. stale is True when the entry has
+        expired but is still within max_stale; (None, False) on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] + self.max_stale <= now:
+                record_cache(self.table, False)
+                return None, False
+            access = self._access.setdefault(key, [now, 0])
+            access[0] = now
+            access[1] += 1
+            if self._flush_due():
+                self._flush(conn)
+        record_cache(self.table, True)
+        return json.loads(row[0]), row[1] <= now
+
+    def expiring(self, within, limit):
+        """
+        Return up to limit keys that expire within the next `within`
+        seconds (or have expired), most read entries first.
+        """
+        with self._lock:
+            conn = self._connect()
+            # Rank by up-to-date read counts
+            self._flush(conn)
+            rows = conn.execute(f"""
+                SELECT key FROM {self.table}
+                WHERE expires_at <= ?
+                ORDER BY hit_count DESC, expires_at
+                LIMIT ?
+            """, (time.time() + within, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def set(self, key, value, ttl=None):
+        """
+        Store value under key for ttl seconds (default_ttl if not given).
+        Entries above max_entries are evicted on the next flush.
+        """
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"""
+                INSERT INTO {self.table} (key, value, expires_at, last_access)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(key)
+                DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+            """, (key, json.dumps(value), expires_at, now))
+            self._writes += 1
+            if self._flush_due():
+                self._flush(conn)
+            else:
+                conn.commit()
+
+    def _flush_due(self):
+        if not self._access and not self._writes:
+            return False
+        return (len(self._access) + self._writes >= CACHE_FLUSH_SIZE
+                or time.monotonic() - self._flushed_at >= CACHE_FLUSH_INTERVAL)
+
+    def _flush(self, conn):
+        """
+        Write buffered access times and read counts in one transaction and,
+        if entries were added since the last flush, evict the least
+        recently used entries above max_entries. Caller holds the lock.
+        """
+        if self._access:
+            conn.executemany(f"""
+                UPDATE {self.table}
+                SET last_access = MAX(last_access, ?), hit_count = hit_count + ?
+                WHERE key = ?
+            """, [(last_access, reads, key) for key, (last_access, reads) in self._access.items()])
+        if self._writes:
+            count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(f"""
+                    DELETE FROM {self.table} WHERE key IN (
+                        SELECT key FROM {self.table} ORDER BY last_access LIMIT ?
+                    )
+                """, (count - self.max_entries,))
+        conn.commit()
+        self._access = {}
+        self._writes = 0
+        self._flushed_at = time.monotonic()
+
+    def flush(self):
+        """
+        Write pending access updates now (called by the refresher).
+        """
+        with self._lock:
+            if self._access or self._writes:
+                self._flush(self._connect())
+
+    def touch(self, key, ttl):
+        """
+        Push back the expiry of an existing entry without changing its value.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"UPDATE {self.table} SET expires_at = ? WHERE key = ?", (time.time() + ttl, key))
+            conn.commit()
+
+    def delete(self, key):
+        """
+        Remove a single entry from the cache.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
@@ -0,0 +1,128 @@
+# catalog.py
+"""
+Local title catalog helper.
+Keeps a denormalized copy of the TMDb fields the pages need (name,
+poster, year, genres, ...) in the titles table, filled when a title is
+ranked, so rank, watchlist, profile and Top 10 pages can render from a
+single JOIN without calling TMDb.
+"""
+from tmdb import get_titles_data, placeholder_details
+from images import image_url
+
+# SQL fragments for reading user_ratings (aliased r) together with the catalog
+CATALOG_COLUMNS = "t.name, t.description, t.poster_path, t.backdrop_path, t.year, t.genres, t.runtime, t.season_count"
+CATALOG_JOIN = "LEFT JOIN titles t ON t.tmdb_id = r.tmdb_id AND t.media_type = COALESCE(r.media_type, 'movie')"
+
+def _normalize(media_type):
+    """
+    Map TMDb/route media types to the values stored in the database.
+    """
+    return "show" if media_type in ("tv", "show") else "movie"
+
+def _catalog_row(tmdb_id, media_type, data):
+    """
+    Build a titles row (as a dict) from raw TMDb JSON.
+    """
+    return {
+        "tmdb_id": int(tmdb_id),
+        "media_type": media_type,
+        "name": data.get("title") or data.get("name"),
+        "description": data.get("overview") or "",
+        "poster_path": data.get("poster_path"),
+        "backdrop_path": data.get("backdrop_path"),
+        "year": (data.get("release_date") or data.get("first_air_date") or "")[:4],
+        "genres": ", ".join([genre["name"] for genre in data.get("genres", [])]),
+        "runtime": data.get("runtime"),
+        "season_count": data.get("number_of_seasons")
+    }
+
+def save_titles(db, pairs):
+    """
+    Make sure every (tmdb_id, media_type) pair has a row in titles.
+    Missing titles are fetched from TMDb concurrently and upserted. Does not commit. Call it before the
+    caller's own writes: the fetch then runs outside any write
+    transaction and only the upsert joins it.
+    Returns a dict mapping (tmdb_id, media_type) to the stored row dict.
+    """
+    pairs = list(dict.fromkeys((int(tmdb_id), _normalize(media_type)) for tmdb_id, media_type in pairs))
+    if not pairs:
+        return {}
+
+    placeholders = ", ".join("?" for _ in pairs)
+    existing = db.execute(f"""
+        SELECT tmdb_id, media_type FROM titles
+        WHERE tmdb_id IN ({placeholders})
+    """, [tmdb_id for tmdb_id, _ in pairs]).fetchall()
+    known = {(row["tmdb_id"], row["media_type"]) for row in existing}
+    pairs = [pair for pair in pairs if pair not in known]
+    if not pairs:
+        return {}
+
+    stored = {}
+    for (tmdb_id, media_type), data in zip(pairs, get_titles_data(pairs)):
+        if data is not None:
+            stored[(tmdb_id, media_type)] = _catalog_row(tmdb_id, media_type, data)
+
+    db.executemany("""
+        INSERT INTO titles (tmdb_id, media_type, name, description, poster_path, backdrop_path,
+                            year, genres, runtime, season_count, fetched_at)
+        VALUES (:tmdb_id, :media_type, :name, :description, :poster_path, :backdrop_path,
+                :year, :genres, :runtime, :season_count, CURRENT_TIMESTAMP)
+        ON CONFLICT(tmdb_id, media_type)
+        DO UPDATE SET name = excluded.name, description = excluded.description,
+                      poster_path = excluded.poster_path, backdrop_path = excluded.backdrop_path,
+                      year = excluded.year, genres = excluded.genres, runtime = excluded.runtime,
+                      season_count = excluded.season_count, fetched_at = excluded.fetched_at
+    """, list(stored.values()))
+    return stored
+
+def title_details(row):
+    """
+    Build a details dict (same fields as tmdb.format_title_details) from a
+    row or dict holding the titles columns.
+    """
+    is_show = row["media_type"] == "show"
+    if is_show:
+        duration = f"{row['season_count']} seasons" if row["season_count"] else "N/A"
+    else:
+        duration = row["runtime"] or "N/A"
+
+    return {
+        "id": row["tmdb_id"],
+        "name": row["name"],
+        "description": row["description"] or "",
+        "year": row["year"] or "",
+        "duration": duration,
+        "genre": row["genres"] or "",
+        "type": "show" if is_show else "movie",
+        "poster_url": image_url(row["poster_path"], "poster", placeholder=True),
+        "thumb_url": image_url(row["poster_path"], "thumb", placeholder=True),
+        "backdrop_url": image_url(row["backdrop_path"], "backdrop"),
+        "poster_path": row["poster_path"],
+        "media_type": "tv" if is_show else "movie"
+    }
+
+def details_from_rows(db, rows):
+    """
+    Build details dicts for user_ratings rows joined with titles
+    (rows must include tmdb_id, media_type and the titles columns).
+    Rows without a catalog entry, e.g. ranked before the catalog existed,
+    are fetched once from TMDb and stored; failures become placeholders.
+    """
+    missing = [(row["tmdb_id"], row["media_type"]) for row in rows if row["name"] is None]
+    fetched = {}
+    if missing:
+        fetched = save_titles(db, missing)
+        db.commit()
+
+    results = []
+    for row in rows:
+        if row["name"] is not None:
+            results.append(title_details(row))
+            continue
+        key = (row["tmdb_id"], _normalize(row["media_type"]))
+        if key in fetched:
+            results.append(title_details(fetched[key]))
+        else:
+            results.append(placeholder_details(row["tmdb_id"], "tv" if key[1] == "show" else "movie"))
+    return results
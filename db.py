@@ -1,20 +1,131 @@
-# db.py
-"""
-Database connection helper.
-Provides a simple function to open a SQLite connection
-with row factory configured for named columns.
-"""
-
-import sqlite3
-import os
-
-def get_db_connection():
-    """
-    Create and return a new SQLite connection to the database file.
-    The row_factory is set to sqlite3.Row to allow access by column name.
-    """
-    # Build full path to database file in current directory
-    db_path = os.path.join(os.path.dirname(__file__), 'database.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+# db.py
+"""
+Database connection helper.
+Opens SQLite connections with row_factory set to sqlite3.Row and the
+pragmas the app relies on (WAL, busy_timeout, synchronous, mmap and page
+cache size), and keeps a small pool of them per worker process so a
+request reuses an open connection instead of connecting from scratch.
+A separate read-only pool serves GET routes that never write.
+"""
+
+import sqlite3
+import os
+import queue
+import threading
+import time
+from metrics import record_sql
+
+# Path to the database file next to this module
+DATABASE = os.getenv("DATABASE_PATH", os.path.join(os.path.abspath(os.path.dirname(__file__)), "database.db"))
+# Connections kept open per pool (and per worker process)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 4))
+# Seconds a connection waits on a locked database before raising
+BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", 5))
+# Prepared statements cached per connection
+CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", 256))
+# Memory-mapped I/O size in bytes and page cache size in KiB
+MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 64 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16 * 1024))
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection that reports every execute/executemany to the request
+    metrics (statement count and time spent in the call).
+    """
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            record_sql(time.perf_counter() - start)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            record_sql(time.perf_counter() - start)
+
+def get_db_connection(path=None, readonly=False):
+    """
+    Create and return a new tuned SQLite connection to the database file.
+    The row_factory is set to sqlite3.Row to allow access by column name.
+    Read-only connections refuse writes (PRAGMA query_only).
+    """
+    conn = sqlite3.connect(
+        path or DATABASE,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=CACHED_STATEMENTS,
+        # Pooled connections are handed to whichever request thread needs one,
+        # but only ever used by one request at a time
+        check_same_thread=False,
+        factory=InstrumentedConnection
+    )
+    conn.row_factory = sqlite3.Row
+    if not readonly:
+        # journal_mode is stored in the database file, so readers inherit it
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT * 1000)}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of open connections to one database file.
+    acquire() returns an idle connection (or opens a new one) and
+    release() puts it back, rolling back anything left uncommitted.
+    """
+    def __init__(self, path=None, size=POOL_SIZE, readonly=False):
+        self.path = path or DATABASE
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return get_db_connection(self.path, self.readonly)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    def close(self):
+        """
+        Close every idle connection.
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pools = {}
+_pools_pid = None
+_lock = threading.Lock()
+
+def get_pool(readonly=False):
+    """
+    Return this process's read-write or read-only pool. Pools are created
+    on first use and again after a fork, so gunicorn workers never share
+    connections inherited from the master process.
+    """
+    global _pools, _pools_pid
+    with _lock:
+        if _pools_pid != os.getpid():
+            _pools = {}
+            _pools_pid = os.getpid()
+        if readonly not in _pools:
+            _pools[readonly] = ConnectionPool(DATABASE, readonly=readonly)
+        return _pools[readonly]
@@ -0,0 +1,130 @@
+# genres.py
+"""
+TMDb genre registry.
+Loads the movie and TV genre lists from a local JSON snapshot at startup
+(falling back to the committed seed in data/genres.json), keeps id -> name
+and name -> id maps plus a precomputed /api/genres body, and refreshes the
+snapshot from TMDb in the background once it is old.
+"""
+import json
+import os
+import threading
+import time
+from tmdb import tmdb_client
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Committed genre lists, read-only; used until a runtime snapshot exists
+GENRES_SEED = os.path.join(BASE_DIR, "data", "genres.json")
+# Runtime snapshot written after each successful refresh from TMDb
+GENRES_SNAPSHOT = os.getenv("GENRES_SNAPSHOT", os.path.join(BASE_DIR, "instance", "genres.json"))
+# Seconds before the snapshot is refreshed from TMDb
+GENRES_REFRESH_INTERVAL = int(os.getenv("GENRES_REFRESH_INTERVAL", 24 * 60 * 60))
+# Seconds to wait before trying again after a failed refresh
+GENRES_RETRY_INTERVAL = int(os.getenv("GENRES_RETRY_INTERVAL", 5 * 60))
+MEDIA_TYPES = ("movie", "tv")
+
+
+class GenreRegistry:
+    """
+    Genre lists for movie and TV with lookups in both directions.
+    lists: {"movie": [{"id", "name"}, ...], "tv": [...]}
+    """
+    def __init__(self, path=GENRES_SNAPSHOT, seed_path=GENRES_SEED,
+                 refresh_interval=GENRES_REFRESH_INTERVAL, retry_interval=GENRES_RETRY_INTERVAL):
+        self.path = path
+        self.seed_path = seed_path
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.lists = {media: [] for media in MEDIA_TYPES}
+        self.id_to_name = {media: {} for media in MEDIA_TYPES}
+        self.name_to_id = {media: {} for media in MEDIA_TYPES}
+        self.body = b""
+        self.loaded_at = 0.0
+        self.attempted_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def _build(self, lists, loaded_at):
+        """
+        Rebuild the lookup maps and the JSON response body, then swap them in.
+        """
+        lists = {media: lists.get(media, []) for media in MEDIA_TYPES}
+        self.id_to_name = {media: {g["id"]: g["name"] for g in lists[media]} for media in MEDIA_TYPES}
+        self.name_to_id = {media: {g["name"]: g["id"] for g in lists[media]} for media in MEDIA_TYPES}
+        self.body = json.dumps(lists).encode("utf-8")
+        self.lists = lists
+        self.loaded_at = loaded_at
+
+    def load(self):
+        """
+        Load the runtime snapshot, else the seed; fetch from TMDb if neither
+        can be read.
+        """
+        for path in (self.path, self.seed_path):
+            try:
+                with open(path, "r") as f:
+                    self._build(json.load(f), os.path.getmtime(path))
+                return
+            except (OSError, ValueError):
+                continue
+        self.refresh()
+
+    def refresh(self):
+        """
+        Fetch both genre lists from TMDb, update the maps and rewrite the
+        runtime snapshot. The attempt time is recorded even if it fails.
+        """
+        self.attempted_at = time.time()
+        try:
+            lists = {}
+            for media in MEDIA_TYPES:
+                data = tmdb_client.get_json(f"/genre/{media}/list", params={"language": "en-US"})
+                if not data or not data.get("genres"):
+                    return
+                lists[media] = data["genres"]
+
+            self._build(lists, time.time())
+
+            # Write to a temp file first so readers never see a partial snapshot
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(lists, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            pass
+        finally:
+            self._refreshing = False
+
+    def refresh_if_stale(self):
+        """
+        Start a background refresh when the snapshot is older than
+        refresh_interval, at most once per retry_interval while TMDb fails.
+        """
+        now = time.time()
+        if now - self.loaded_at <= self.refresh_interval or now - self.attempted_at <= self.retry_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self.attempted_at = now
+        threading.Thread(target=self.refresh, name="genres-refresh", daemon=True).start()
+
+    def ids_for_names(self, names, media_type=None):
+        """
+        Convert genre names to TMDb ids (both media types unless one is given).
+        """
+        media_types = [media_type] if media_type else MEDIA_TYPES
+        ids = []
+        for name in names:
+            for media in media_types:
+                if name in self.name_to_id[media]:
+                    ids.append(self.name_to_id[media][name])
+                    break
+        return ids
+
+
+# Shared registry, loaded once when the app starts
+genre_registry = GenreRegistry()
+genre_registry.load()
@@ -0,0 +1,117 @@
+# http_cache.py
+"""
+Conditional GET and compression helpers for the JSON API.
+Responses carry a strong ETag (one per content coding), answer a
+matching If-None-Match with 304 before building the body, and are
+compressed with brotli (when installed) or gzip. Compressed bodies of
+shared global payloads are kept in memory (a small LRU) and reused until
+the payload changes.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from flask import Response, current_app, request
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Compressed variants of global payloads: memo_key -> (etag, {encoding: body}),
+# least recently used first. Keys can come from query params, hence the cap
+MEMO_MAX_ENTRIES = int(os.getenv("HTTP_MEMO_MAX_ENTRIES", 256))
+_memo = OrderedDict()
+_lock = threading.Lock()
+
+def json_bytes(payload):
+    """
+    Serialize payload the way jsonify would, as UTF-8 bytes.
+    """
+    return current_app.json.dumps(payload).encode("utf-8")
+
+def make_etag(*parts):
+    """
+    Build an ETag value from the given parts (bytes or anything str()-able).
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+def negotiate_encoding():
+    """
+    Pick the content coding for this request: br, gzip or None.
+    """
+    for encoding in (("br", "gzip") if brotli else ("gzip",)):
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+def _encode(raw, encoding):
+    if encoding == "br":
+        return brotli.compress(raw)
+    if encoding == "gzip":
+        return gzip.compress(raw, compresslevel=6)
+    return raw
+
+def _encoded_body(build, etag, encoding, memo_key):
+    """
+    Return the body for encoding, reusing the memoized variant of a
+    global payload when its etag is unchanged.
+    """
+    if memo_key is None:
+        return _encode(build(), encoding)
+
+    with _lock:
+        cached = _memo.get(memo_key)
+        if cached and cached[0] == etag and encoding in cached[1]:
+            _memo.move_to_end(memo_key)
+            return cached[1][encoding]
+
+    body = _encode(build(), encoding)
+    with _lock:
+        cached = _memo.get(memo_key)
+        if not cached or cached[0] != etag:
+            cached = (etag, {})
+            _memo[memo_key] = cached
+        cached[1][encoding] = body
+        _memo.move_to_end(memo_key)
+        while len(_memo) > MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
+    return body
+
+def conditional_json(etag, build, public=False, max_age=0, memo_key=None, cacheable=None):
+    """
+    Return a JSON response validated by etag.
+    build() returns the uncompressed body and is only called when the
+    client's copy is stale. Public responses may be stored by shared
+    caches for max_age seconds; per-user ones are private and always
+    revalidated. memo_key (global payloads only) enables reuse of the
+    compressed body across requests. cacheable, if given, is called after
+    build(); when it returns False (e.g. the body holds placeholders) the
+    response gets no ETag and is not stored, so the next request rebuilds it.
+    """
+    encoding = negotiate_encoding()
+    tag = f"{etag}-{encoding}" if encoding else etag
+
+    if request.if_none_match.contains(tag):
+        response = Response(status=304)
+    else:
+        response = Response(_encoded_body(build, etag, encoding, memo_key), mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if cacheable is not None and not cacheable():
+            response.headers["Cache-Control"] = "no-store"
+            response.vary.add("Accept-Encoding")
+            return response
+
+    response.set_etag(tag)
+    if public:
+        response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    else:
+        response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
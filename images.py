@@ -0,0 +1,148 @@
+# images.py
+"""
+Local proxy and disk cache for TMDb posters and backdrops.
+/img/<size>/<file> fetches the image from TMDb the first time, stores
+the variant on disk under a content-hashed name, and serves it from disk
+afterwards with far-future cache headers (range requests supported).
+With Pillow installed images are resized to the exact width and served
+as WebP to browsers that accept it (JPEG otherwise); without it the
+closest TMDb size is stored as is.
+"""
+import hashlib
+import io
+import os
+import re
+import requests
+from metrics import upstream_timer
+
+try:
+    from PIL import Image  # Optional: pip install Pillow
+except ImportError:
+    Image = None
+
+# Upstream image host and local cache directory
+IMAGE_UPSTREAM_URL = os.getenv("TMDB_IMAGE_URL", "https://image.tmdb.org/t/p")
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache"))
+# Seconds browsers may keep a served image (content-hashed, so never changes)
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+# Widths TMDb serves directly, and the widths /img accepts
+TMDB_WIDTHS = (92, 154, 185, 300, 342, 500, 780, 1280)
+ALLOWED_WIDTHS = (100, 200, 300, 342, 500, 780, 1280)
+# Size used for each kind of image in pages and API payloads
+IMAGE_SIZES = {
+    "poster": os.getenv("IMAGE_SIZE_POSTER", "w500"),
+    "thumb": os.getenv("IMAGE_SIZE_THUMB", "w200"),
+    "backdrop": os.getenv("IMAGE_SIZE_BACKDROP", "w1280"),
+}
+PLACEHOLDER_URL = "/static/images/placeholder.png"
+
+_FILENAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp)$")
+_session = requests.Session()
+
+def image_url(path, usage="poster", placeholder=False):
+    """
+    Local URL for a TMDb image path (e.g. "/abc.jpg") at the size configured
+    for usage. Returns the placeholder (or None) when there is no path.
+    """
+    if not path:
+        return PLACEHOLDER_URL if placeholder else None
+    return f"/img/{IMAGE_SIZES[usage]}/{path.lstrip('/')}"
+
+def parse_size(size):
+    """
+    Return the width for a size like "w200", or None if it is not allowed.
+    """
+    match = re.fullmatch(r"w(\d+)", size)
+    if not match or int(match.group(1)) not in ALLOWED_WIDTHS:
+        return None
+    return int(match.group(1))
+
+def valid_filename(filename):
+    return bool(_FILENAME.match(filename))
+
+def upstream_url(width, filename):
+    """
+    TMDb URL of the smallest served size that is at least width wide.
+    """
+    tmdb_width = next((w for w in TMDB_WIDTHS if w >= width), None)
+    return f"{IMAGE_UPSTREAM_URL}/{'w%d' % tmdb_width if tmdb_width else 'original'}/{filename}"
+
+def _variant_format(accept_webp):
+    if Image is None:
+        return "orig"
+    return "webp" if accept_webp else "jpeg"
+
+def _key_path(width, filename, fmt):
+    key = hashlib.sha1(f"w{width}/{filename}/{fmt}".encode("utf-8")).hexdigest()
+    return os.path.join(IMAGE_CACHE_DIR, "keys", key)
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _convert(data, width, fmt):
+    """
+    Resize to width (never upscale) and re-encode as fmt with Pillow.
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    if fmt == "webp":
+        image.save(out, "WEBP", quality=80, method=4)
+    else:
+        image.save(out, "JPEG", quality=82, optimize=True, progressive=True)
+    return out.getvalue()
+
+def get_image(width, filename, accept_webp=False):
+    """
+    Return (file path, content hash, mimetype) of the cached variant,
+    fetching and storing it first if needed. Returns None if the upstream
+    fetch fails.
+    """
+    fmt = _variant_format(accept_webp)
+    key_path = _key_path(width, filename, fmt)
+
+    try:
+        with open(key_path, "r") as f:
+            name = f.read().strip()
+        path = os.path.join(IMAGE_CACHE_DIR, "objects", name)
+        if os.path.exists(path):
+            return path, os.path.splitext(os.path.basename(name))[0], _mimetype(name)
+    except OSError:
+        pass
+
+    try:
+        with upstream_timer("tmdb_images"):
+            response = _session.get(upstream_url(width, filename), timeout=10)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+
+    data = response.content
+    ext = os.path.splitext(filename)[1].lstrip(".").lower()
+    if fmt != "orig":
+        try:
+            data = _convert(data, width, fmt)
+            ext = "webp" if fmt == "webp" else "jpg"
+        except Exception:
+            pass
+
+    # Content-hashed object name, then point this variant's key at it
+    digest = hashlib.sha1(data).hexdigest()
+    name = f"{digest[:2]}/{digest}.{ext}"
+    path = os.path.join(IMAGE_CACHE_DIR, "objects", name)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    _write_atomic(key_path, name.encode("utf-8"))
+    return path, digest, _mimetype(name)
+
+def _mimetype(name):
+    ext = os.path.splitext(name)[1].lower()
+    return {".webp": "image/webp", ".png": "image/png"}.get(ext, "image/jpeg")
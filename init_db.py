@@ -1,20 +1,19 @@
-# init_db.py
-"""
-Database initialization script.
-Reads schema.sql and applies it to reset or create the database.
-"""
-import sqlite3
-import os
-
-# Path to the database file
-db_path = os.path.join(os.path.dirname(__file__), "database.db")
-
-# Open a connection, apply schema, and close
-with open("schema.sql", "r") as f:
-    schema = f.read()
-
-conn = sqlite3.connect(db_path)
-conn.executescript(schema)
-conn.close()
-
-print("✅ Database initialized with schema.")
+# init_db.py
+"""
+Database initialization script.
+Creates the database from schema.sql, or upgrades an existing one by
+applying its pending migrations (see migrations.py). Never drops data.
+"""
+from db import get_db_connection
+from migrations import migrate, get_version
+
+# Open a connection, apply pending migrations, and close
+conn = get_db_connection()
+applied = migrate(conn)
+version = get_version(conn)
+conn.close()
+
+if applied:
+    print(f"✅ Database initialized at schema version {version}.")
+else:
+    print(f"✅ Database already at schema version {version}.")
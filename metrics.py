@@ -0,0 +1,256 @@
+# metrics.py
+"""
+Request metrics in Prometheus text format.
+Each request is tagged with its Flask endpoint (a context variable), so
+TMDb/YouTube calls, SQL statements and cache lookups made while serving
+it are counted against that endpoint; work done outside a request (the
+refresher, background refreshes) is counted as "background". Counters
+live in memory per worker. When METRICS_DIR is set every worker also
+writes them to its own file there, and /metrics sums all the files, so
+a scrape of any gunicorn worker covers the whole server.
+"""
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Shared directory for per-worker metric files (empty: this process only)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+# Seconds between writes of this worker's metric file
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+# Files not written for this many seconds are dropped, even if their pid is alive
+METRICS_STALE_AFTER = float(os.getenv("METRICS_STALE_AFTER", 24 * 60 * 60))
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Metric families: name -> (type, help)
+METRICS = {
+    "app_requests_total": ("counter", "Requests served, by endpoint, method and status code."),
+    "app_request_duration_seconds": ("histogram", "Request latency by endpoint."),
+    "app_upstream_requests_total": ("counter", "HTTP calls to TMDb/YouTube made while serving the endpoint."),
+    "app_upstream_seconds_total": ("counter", "Time spent in those calls (concurrent calls add up)."),
+    "app_sql_statements_total": ("counter", "SQL statements executed on the app database."),
+    "app_sql_seconds_total": ("counter", "Time spent executing those statements."),
+    "app_cache_requests_total": ("counter", "Cache lookups by cache and result (hit or miss)."),
+    "app_cache_hit_ratio": ("gauge", "Hits / lookups per cache, over all endpoints."),
+}
+
+# Endpoint the current thread is working for
+current_endpoint = contextvars.ContextVar("current_endpoint", default="background")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}" if labels else ""
+
+def _worker_alive(filename):
+    # worker-<pid>-<started>.json; only meaningful for workers on this host
+    try:
+        pid = int(filename.split("-")[1])
+        os.kill(pid, 0)
+    except (IndexError, ValueError, ProcessLookupError):
+        return False
+    except OSError:
+        # EPERM: the pid exists but belongs to another user
+        pass
+    return True
+
+def _sample_order(sample):
+    # Histogram buckets must be listed by numeric le, not as strings
+    name, labels, _ = sample
+    return name, [(label, float(value) if label == "le" else value) for label, value in labels]
+
+
+class MetricsRegistry:
+    """
+    Counters keyed by (sample name, ((label, value), ...)).
+    Histograms are stored as their cumulative _bucket, _sum and _count samples.
+    """
+    def __init__(self, directory=METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL,
+                 stale_after=METRICS_STALE_AFTER):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self._values = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._started = time.time()
+        self._flushed_at = time.monotonic()
+
+    def _check_pid(self):
+        # A forked worker must not report the counts it inherited
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._started = time.time()
+            self._values = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        """
+        Add one observation to the histogram name.
+        """
+        labels = tuple(sorted(labels.items()))
+        with self._lock:
+            self._check_pid()
+            for bound in LATENCY_BUCKETS + (float("inf"),):
+                if value <= bound:
+                    key = (f"{name}_bucket", labels + (("le", "+Inf" if bound == float("inf") else f"{bound:g}"),))
+                    self._values[key] = self._values.get(key, 0) + 1
+            for suffix, amount in (("_sum", value), ("_count", 1)):
+                key = (name + suffix, labels)
+                self._values[key] = self._values.get(key, 0) + amount
+
+    @property
+    def path(self):
+        # pid plus start time, so a reused pid never overwrites a dead worker's counts
+        return os.path.join(self.directory, f"worker-{self._pid}-{int(self._started)}.json")
+
+    def flush(self):
+        """
+        Write this worker's counters to its file in directory.
+        """
+        if not self.directory:
+            return
+        with self._lock:
+            self._check_pid()
+            samples = [[name, list(labels), value] for (name, labels), value in self._values.items()]
+            path = self.path
+        os.makedirs(self.directory, exist_ok=True)
+        # A unique temp file per write, renamed under a lock, so concurrent
+        # flushes (request threads, /metrics) never trip over each other
+        with self._flush_lock:
+            with tempfile.NamedTemporaryFile("w", dir=self.directory, prefix=".worker-",
+                                             suffix=".tmp", delete=False) as f:
+                json.dump(samples, f)
+            try:
+                os.replace(f.name, path)
+            except OSError:
+                os.unlink(f.name)
+                raise
+            self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        """
+        Flush if the last write is older than flush_interval.
+        """
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def collect(self):
+        """
+        Return {(name, labels): value} summed over every worker's file, or
+        this process's counters when no directory is configured. Files of
+        workers that have exited or stopped writing are deleted.
+        """
+        if not self.directory:
+            with self._lock:
+                return dict(self._values)
+
+        try:
+            self.flush()
+        except OSError:
+            logger.warning("could not write metrics file %s", self.path, exc_info=True)
+        totals = {}
+        now = time.time()
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                if now - os.path.getmtime(path) > self.stale_after or not _worker_alive(filename):
+                    os.unlink(path)
+                    continue
+                with open(path, "r") as f:
+                    samples = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in samples:
+                key = (name, tuple(tuple(label) for label in labels))
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        """
+        Prometheus text exposition of the collected counters, plus the
+        per-cache hit ratio.
+        """
+        values = self.collect()
+
+        hits, lookups = {}, {}
+        for (name, labels), value in values.items():
+            if name == "app_cache_requests_total":
+                cache = dict(labels)["cache"]
+                lookups[cache] = lookups.get(cache, 0) + value
+                if dict(labels)["result"] == "hit":
+                    hits[cache] = hits.get(cache, 0) + value
+        for cache, total in lookups.items():
+            values[("app_cache_hit_ratio", (("cache", cache),))] = hits.get(cache, 0) / total if total else 0.0
+
+        lines = []
+        for family, (kind, help_text) in METRICS.items():
+            samples = sorted(
+                ((name, labels, value) for (name, labels), value in values.items()
+                 if name == family or (kind == "histogram" and name in (f"{family}_bucket", f"{family}_sum", f"{family}_count"))),
+                key=_sample_order
+            )
+            if not samples:
+                continue
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {value}" for name, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry for this process
+metrics = MetricsRegistry()
+
+def record_upstream(service, seconds):
+    """
+    Count one HTTP call to service ("tmdb", "tmdb_images", "youtube").
+    """
+    labels = {"endpoint": current_endpoint.get(), "service": service}
+    metrics.inc("app_upstream_requests_total", labels)
+    metrics.inc("app_upstream_seconds_total", labels, seconds)
+
+@contextmanager
+def upstream_timer(service):
+    """
+    Time the enclosed HTTP call (also when it raises) as one upstream call.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_upstream(service, time.perf_counter() - start)
+
+def record_sql(seconds):
+    labels = {"endpoint": current_endpoint.get()}
+    metrics.inc("app_sql_statements_total", labels)
+    metrics.inc("app_sql_seconds_total", labels, seconds)
+
+def record_cache(cache, hit):
+    metrics.inc("app_cache_requests_total", {
+        "endpoint": current_endpoint.get(), "cache": cache, "result": "hit" if hit else "miss"
+    })
+
+def record_request(endpoint, method, status, seconds):
+    metrics.inc("app_requests_total", {"endpoint": endpoint, "method": method, "status": str(status)})
+    metrics.observe("app_request_duration_seconds", {"endpoint": endpoint}, seconds)
+    metrics.maybe_flush()
@@ -0,0 +1,215 @@
+# migrations.py
+"""
+Versioned, non-destructive schema migrations.
+The database's PRAGMA user_version records the last migration applied.
+A new database is created from schema.sql (the full current schema) and
+marked as up to date; an existing one gets only the migrations it is
+missing, each in its own transaction, so data is never dropped.
+When changing the schema, append a migration here and update schema.sql.
+"""
+import os
+import sqlite3
+from watched import episode_bit, mask_to_blob
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+RANKS_WATCHED = "('WATCHED', 'WATCHING', 'ABSOLUTE CINEMA', 'GREAT', 'GOOD', 'COULD BE BETTER', 'BAD')"
+
+def _add_column(table, column, definition):
+    """
+    Build a migration that adds a column unless it already exists
+    (databases created from an older schema.sql may have it).
+    """
+    def migration(conn):
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column in columns:
+            return ""
+        return f"ALTER TABLE {table} ADD COLUMN {column} {definition};"
+    return migration
+
+def _stats_trigger_updates(row, sign):
+    """
+    SET clause adding (sign '+') or removing (sign '-') one rating row
+    from the user_stats counters.
+    """
+    return f"""
+        watched = watched {sign} (IFNULL({row}.rank, '') IN {RANKS_WATCHED}),
+        absolute_cinema = absolute_cinema {sign} (IFNULL({row}.rank, '') = 'ABSOLUTE CINEMA'),
+        great = great {sign} (IFNULL({row}.rank, '') = 'GREAT'),
+        good = good {sign} (IFNULL({row}.rank, '') = 'GOOD'),
+        could_be_better = could_be_better {sign} (IFNULL({row}.rank, '') = 'COULD BE BETTER'),
+        bad = bad {sign} (IFNULL({row}.rank, '') = 'BAD'),
+        watching = watching {sign} (IFNULL({row}.rank, '') = 'WATCHING'),
+        watchlist = watchlist {sign} (IFNULL({row}.rank, '') = 'WATCHLIST')"""
+
+def _ensure_stats_row(row):
+    """
+    Statement creating the user's user_stats row if it is missing, without
+    relying on a conflict clause.
+    """
+    return f"""INSERT INTO user_stats (user_id)
+            SELECT {row}.user_id WHERE NOT EXISTS (SELECT 1 FROM user_stats WHERE user_id = {row}.user_id);"""
+
+def _episodes_to_bitmaps(conn):
+    """
+    Build the migration that moves user_episodes_watched rows into
+    per-season bitmaps (see watched.py) and drops the old table.
+    """
+    masks = {}
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    if "user_episodes_watched" in tables:
+        for user_id, tmdb_id, season, episode in conn.execute("""
+            SELECT user_id, tmdb_id, season, episode FROM user_episodes_watched
+            WHERE watched = 1 AND episode >= 1
+        """):
+            key = (int(user_id), int(tmdb_id), int(season))
+            masks[key] = masks.get(key, 0) | episode_bit(episode)
+
+    rows = [
+        f"INSERT INTO user_season_watched (user_id, tmdb_id, season, bits) "
+        f"VALUES ({user_id}, {tmdb_id}, {season}, X'{mask_to_blob(mask).hex()}');"
+        for (user_id, tmdb_id, season), mask in masks.items()
+    ]
+    return "\n".join([
+        """
+        CREATE TABLE IF NOT EXISTS user_season_watched (
+            user_id INTEGER NOT NULL,
+            tmdb_id INTEGER NOT NULL,
+            season INTEGER NOT NULL,
+            bits BLOB NOT NULL DEFAULT X'',
+            PRIMARY KEY (user_id, tmdb_id, season)
+        ) WITHOUT ROWID;
+        """,
+        *rows,
+        "DROP TABLE IF EXISTS user_episodes_watched;"
+    ])
+
+# (version, description, SQL script or callable(conn) returning one)
+MIGRATIONS = [
+    (1, "titles catalog", """
+        CREATE TABLE IF NOT EXISTS titles (
+            tmdb_id INTEGER NOT NULL,
+            media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'show')),
+            name TEXT,
+            description TEXT,
+            poster_path TEXT,
+            backdrop_path TEXT,
+            year TEXT,
+            genres TEXT,
+            runtime INTEGER,
+            season_count INTEGER,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (tmdb_id, media_type)
+        );
+    """),
+    (2, "users.ratings_version", _add_column("users", "ratings_version", "INTEGER NOT NULL DEFAULT 0")),
+    (3, "user_stats counters", f"""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            watched INTEGER NOT NULL DEFAULT 0,
+            absolute_cinema INTEGER NOT NULL DEFAULT 0,
+            great INTEGER NOT NULL DEFAULT 0,
+            good INTEGER NOT NULL DEFAULT 0,
+            could_be_better INTEGER NOT NULL DEFAULT 0,
+            bad INTEGER NOT NULL DEFAULT 0,
+            watching INTEGER NOT NULL DEFAULT 0,
+            watchlist INTEGER NOT NULL DEFAULT 0
+        );
+
+        DROP TRIGGER IF EXISTS user_stats_insert;
+        CREATE TRIGGER user_stats_insert AFTER INSERT ON user_ratings
+        BEGIN
+            {_ensure_stats_row("NEW")}
+            UPDATE user_stats SET {_stats_trigger_updates("NEW", "+")}
+            WHERE user_id = NEW.user_id;
+        END;
+
+        DROP TRIGGER IF EXISTS user_stats_delete;
+        CREATE TRIGGER user_stats_delete AFTER DELETE ON user_ratings
+        BEGIN
+            UPDATE user_stats SET {_stats_trigger_updates("OLD", "-")}
+            WHERE user_id = OLD.user_id;
+        END;
+
+        DROP TRIGGER IF EXISTS user_stats_update;
+        CREATE TRIGGER user_stats_update AFTER UPDATE OF rank, user_id ON user_ratings
+        BEGIN
+            UPDATE user_stats SET {_stats_trigger_updates("OLD", "-")}
+            WHERE user_id = OLD.user_id;
+            {_ensure_stats_row("NEW")}
+            UPDATE user_stats SET {_stats_trigger_updates("NEW", "+")}
+            WHERE user_id = NEW.user_id;
+        END;
+
+        -- Recount from the existing ratings
+        DELETE FROM user_stats;
+        INSERT INTO user_stats (user_id, watched, absolute_cinema, great, good, could_be_better, bad, watching, watchlist)
+        SELECT user_id,
+               SUM(IFNULL(rank, '') IN {RANKS_WATCHED}),
+               SUM(IFNULL(rank, '') = 'ABSOLUTE CINEMA'),
+               SUM(IFNULL(rank, '') = 'GREAT'),
+               SUM(IFNULL(rank, '') = 'GOOD'),
+               SUM(IFNULL(rank, '') = 'COULD BE BETTER'),
+               SUM(IFNULL(rank, '') = 'BAD'),
+               SUM(IFNULL(rank, '') = 'WATCHING'),
+               SUM(IFNULL(rank, '') = 'WATCHLIST')
+        FROM user_ratings
+        GROUP BY user_id;
+    """),
+    (4, "covering indexes for ratings and watched episodes", """
+        CREATE INDEX IF NOT EXISTS idx_ratings_user_rank
+            ON user_ratings(user_id, rank, created, media_type, tmdb_id, visible_in_rank, top10_position);
+        CREATE INDEX IF NOT EXISTS idx_ratings_user_top10
+            ON user_ratings(user_id, media_type, top10_position, tmdb_id)
+            WHERE top10_position IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_episodes_user_title
+            ON user_episodes_watched(user_id, tmdb_id, watched, season, episode);
+    """),
+    (5, "watched episodes as per-season bitmaps", _episodes_to_bitmaps),
+    (6, "users.session_generation", _add_column("users", "session_generation", "INTEGER NOT NULL DEFAULT 0")),
+    (7, "rank tier keyset order in idx_ratings_user_rank", """
+        DROP INDEX IF EXISTS idx_ratings_user_rank;
+        CREATE INDEX idx_ratings_user_rank
+            ON user_ratings(user_id, rank, created, id, media_type, tmdb_id, visible_in_rank, top10_position);
+    """),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _run_script(conn, script, version):
+    """
+    Run script and set user_version to version in one transaction.
+    """
+    try:
+        conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {int(version)};\nCOMMIT;")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+def migrate(conn, log=print):
+    """
+    Bring the database up to LATEST_VERSION. Returns the number of
+    migrations applied (0 if it was already current).
+    """
+    version = get_version(conn)
+    has_tables = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone()
+
+    if not has_tables:
+        with open(SCHEMA_PATH, "r") as f:
+            _run_script(conn, f.read(), LATEST_VERSION)
+        log(f"Created schema at version {LATEST_VERSION}")
+        return 1
+
+    applied = 0
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        script = migration(conn) if callable(migration) else migration
+        _run_script(conn, script, number)
+        log(f"Applied migration {number}: {description}")
+        applied += 1
+    return applied
@@ -0,0 +1,181 @@
+# refresher.py
+"""
+Background refresh for cached TMDb data (stale-while-revalidate).
+Request paths serve stale cache entries immediately and queue them here;
+a daemon thread (or the `flask refresh-cache` command) re-fetches queued
+entries and entries nearing expiry, most viewed first, within a request
+budget per minute.
+"""
+import os
+import threading
+import time
+
+# Maximum number of upstream requests the refresher may send per minute.
+# The budget is per process: with N gunicorn workers each one runs its own
+# refresher, so the upstream rate can reach N times this value. Set it to
+# the overall budget divided by the worker count.
+REFRESH_BUDGET = int(os.getenv("TMDB_REFRESH_BUDGET", 60))
+# Entries expiring within this many seconds are refreshed ahead of time
+REFRESH_AHEAD = int(os.getenv("TMDB_REFRESH_AHEAD", 10 * 60))
+# Also scan for expiring entries from the in-process thread (not only queued ones)
+REFRESH_SCAN = os.getenv("TMDB_REFRESH_SCAN", "0") == "1"
+REFRESH_INTERVAL = float(os.getenv("TMDB_REFRESH_INTERVAL", 5))
+
+
+class Gone(Exception):
+    """
+    Raised by a loader when the upstream resource no longer exists
+    (e.g. TMDb answers 404 for a removed title).
+    """
+
+
+class Refresher:
+    """
+    Re-fetches cache entries in the background.
+    Each registered cache comes with a loader(key) that returns the fresh
+    value (or None, or raises Gone if the entry should be dropped) and an
+    optional TTL for the refreshed entry, either in seconds or as a
+    function of the new value.
+    """
+    def __init__(self, budget_per_minute=REFRESH_BUDGET, ahead=REFRESH_AHEAD):
+        self.budget_per_minute = budget_per_minute
+        self.ahead = ahead
+        self.sources = {}
+        self.pending = {}
+        self.refreshed = 0
+        self.failed = 0
+        self.removed = 0
+        self._spent = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def register(self, cache, loader, ttl=None):
+        """
+        Register a cache whose entries can be refreshed with loader(key).
+        """
+        self.sources[cache.table] = (cache, loader, ttl)
+
+    def queue(self, cache, key):
+        """
+        Ask for key to be refreshed soon. Starts the background thread on
+        first use, so each gunicorn worker gets its own after forking.
+        """
+        if cache.table not in self.sources:
+            return
+        with self._lock:
+            self.pending[(cache.table, key)] = True
+        self.start()
+        self._wakeup.set()
+
+    def refresh(self, cache, key):
+        """
+        Re-fetch a single entry now. Returns True if it was updated.
+        """
+        _, loader, ttl = self.sources[cache.table]
+        try:
+            value = loader(key)
+        except Gone:
+            # Upstream no longer has it; stop serving the stale copy
+            cache.delete(key)
+            self.removed += 1
+            return False
+        except Exception:
+            value = None
+        if value is None:
+            # Keep serving the old value and retry later instead of every cycle
+            cache.touch(key, self.ahead)
+            self.failed += 1
+            return False
+        cache.set(key, value, ttl(value) if callable(ttl) else ttl)
+        self.refreshed += 1
+        return True
+
+    def _take_budget(self):
+        """
+        Consume one request from the per-minute budget; False if it is spent.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._spent = [t for t in self._spent if now - t < 60]
+            if len(self._spent) >= self.budget_per_minute:
+                return False
+            self._spent.append(now)
+            return True
+
+    def run_once(self, scan=True):
+        """
+        Refresh queued entries first, then (if scan) entries nearing
+        expiry in most-viewed order, until the budget runs out.
+        Returns the number of entries refreshed.
+        """
+        # Write the access times and read counts buffered by request threads
+        for cache, _, _ in list(self.sources.values()):
+            cache.flush()
+
+        count = 0
+        while True:
+            with self._lock:
+                if not self.pending:
+                    break
+                table, key = next(iter(self.pending))
+            if not self._take_budget():
+                return count
+            with self._lock:
+                self.pending.pop((table, key), None)
+            count += self.refresh(self.sources[table][0], key)
+
+        if scan:
+            for cache, _, _ in list(self.sources.values()):
+                for key in cache.expiring(self.ahead, self.budget_per_minute):
+                    if not self._take_budget():
+                        return count
+                    count += self.refresh(cache, key)
+        return count
+
+    def run_forever(self, scan=True, interval=REFRESH_INTERVAL):
+        """
+        Loop run_once, waking up early whenever something is queued.
+        """
+        while True:
+            self.run_once(scan=scan)
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """
+        Start the in-process daemon thread if it is not running yet.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self.run_forever, kwargs={"scan": REFRESH_SCAN},
+                name="cache-refresher", daemon=True
+            )
+            self._thread.start()
+
+
+# Shared refresher for this process
+refresher = Refresher()
+
+def get_or_refresh(cache, key, loader, ttl=None):
+    """
+    Stale-while-revalidate read: return a fresh cached value, or a stale
+    one while queueing a background refresh, or load synchronously on a
+    miss. None results from loader are not cached (a loader raising Gone
+    counts as None). ttl may be a function of the loaded value.
+    """
+    value, stale = cache.get_entry(key)
+    if value is None:
+        try:
+            value = loader()
+        except Gone:
+            return None
+        if value is not None:
+            cache.set(key, value, ttl(value) if callable(ttl) else ttl)
+    elif stale:
+        refresher.queue(cache, key)
+    return value
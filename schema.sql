@@ -1,45 +1,142 @@
-DROP TABLE IF EXISTS user_ratings;
-DROP TABLE IF EXISTS user_episodes_watched;
-DROP TABLE IF EXISTS users;
-
-CREATE TABLE user_ratings (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    tmdb_id INTEGER,
-    media_type TEXT CHECK(media_type IN ('movie', 'show')),
-    rank TEXT CHECK(rank IN (
-        'ABSOLUTE CINEMA',
-        'GREAT',
-        'GOOD',
-        'COULD BE BETTER',
-        'BAD',
-        'WATCHED',
-        'WATCHING',
-        'WATCHLIST',
-        'DIDN''T WATCH',
-        'NOT INTERESTED'
-    )),
-    watched_episodes TEXT DEFAULT '',
-    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    visible_in_rank BOOLEAN DEFAULT 1,
-    top10_position INTEGER DEFAULT NULL
-);
-
-CREATE UNIQUE INDEX idx_user_title ON user_ratings(user_id, tmdb_id);
-
-CREATE TABLE user_episodes_watched (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER,
-    tmdb_id INTEGER,
-    season INTEGER,
-    episode INTEGER,
-    watched INTEGER DEFAULT 0,
-    UNIQUE(user_id, tmdb_id, season, episode)
-);
-
-CREATE TABLE IF NOT EXISTS users (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    avatar TEXT DEFAULT 'avatar_default.png'
-);
+-- Full current schema, used by migrations.py to create a new database.
+-- Existing databases are upgraded by the migrations in migrations.py;
+-- keep both in sync when changing the schema.
+
+CREATE TABLE user_ratings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    tmdb_id INTEGER,
+    media_type TEXT CHECK(media_type IN ('movie', 'show')),
+    rank TEXT CHECK(rank IN (
+        'ABSOLUTE CINEMA',
+        'GREAT',
+        'GOOD',
+        'COULD BE BETTER',
+        'BAD',
+        'WATCHED',
+        'WATCHING',
+        'WATCHLIST',
+        'DIDN''T WATCH',
+        'NOT INTERESTED'
+    )),
+    watched_episodes TEXT DEFAULT '',
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    visible_in_rank BOOLEAN DEFAULT 1,
+    top10_position INTEGER DEFAULT NULL
+);
+
+CREATE UNIQUE INDEX idx_user_title ON user_ratings(user_id, tmdb_id);
+
+-- Covers the per-user rank/status lists (rank, watchlist, home carousels, status index);
+-- (created, id) is the keyset order of the rank page tiers
+CREATE INDEX idx_ratings_user_rank
+    ON user_ratings(user_id, rank, created, id, media_type, tmdb_id, visible_in_rank, top10_position);
+
+-- Covers the Top 10 lists, ordered by position
+CREATE INDEX idx_ratings_user_top10
+    ON user_ratings(user_id, media_type, top10_position, tmdb_id)
+    WHERE top10_position IS NOT NULL;
+
+-- Watched episodes: one bitmap per user, show and season (bit n - 1 = episode n, see watched.py)
+CREATE TABLE user_season_watched (
+    user_id INTEGER NOT NULL,
+    tmdb_id INTEGER NOT NULL,
+    season INTEGER NOT NULL,
+    bits BLOB NOT NULL DEFAULT X'',
+    PRIMARY KEY (user_id, tmdb_id, season)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    avatar TEXT DEFAULT 'avatar_default.png',
+    ratings_version INTEGER NOT NULL DEFAULT 0,
+    -- Bumped on password change; sessions from an older generation are rejected
+    session_generation INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE titles (
+    tmdb_id INTEGER NOT NULL,
+    media_type TEXT NOT NULL CHECK(media_type IN ('movie', 'show')),
+    name TEXT,
+    description TEXT,
+    poster_path TEXT,
+    backdrop_path TEXT,
+    year TEXT,
+    genres TEXT,
+    runtime INTEGER,
+    season_count INTEGER,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tmdb_id, media_type)
+);
+
+-- Per-user counters for the profile page, kept up to date by the triggers below
+-- (which avoid INSERT OR IGNORE: an outer UPSERT would override its conflict handling)
+CREATE TABLE user_stats (
+    user_id INTEGER PRIMARY KEY,
+    watched INTEGER NOT NULL DEFAULT 0,
+    absolute_cinema INTEGER NOT NULL DEFAULT 0,
+    great INTEGER NOT NULL DEFAULT 0,
+    good INTEGER NOT NULL DEFAULT 0,
+    could_be_better INTEGER NOT NULL DEFAULT 0,
+    bad INTEGER NOT NULL DEFAULT 0,
+    watching INTEGER NOT NULL DEFAULT 0,
+    watchlist INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER user_stats_insert AFTER INSERT ON user_ratings
+BEGIN
+    INSERT INTO user_stats (user_id)
+        SELECT NEW.user_id WHERE NOT EXISTS (SELECT 1 FROM user_stats WHERE user_id = NEW.user_id);
+    UPDATE user_stats SET
+        watched = watched + (IFNULL(NEW.rank, '') IN ('WATCHED', 'WATCHING', 'ABSOLUTE CINEMA', 'GREAT', 'GOOD', 'COULD BE BETTER', 'BAD')),
+        absolute_cinema = absolute_cinema + (IFNULL(NEW.rank, '') = 'ABSOLUTE CINEMA'),
+        great = great + (IFNULL(NEW.rank, '') = 'GREAT'),
+        good = good + (IFNULL(NEW.rank, '') = 'GOOD'),
+        could_be_better = could_be_better + (IFNULL(NEW.rank, '') = 'COULD BE BETTER'),
+        bad = bad + (IFNULL(NEW.rank, '') = 'BAD'),
+        watching = watching + (IFNULL(NEW.rank, '') = 'WATCHING'),
+        watchlist = watchlist + (IFNULL(NEW.rank, '') = 'WATCHLIST')
+    WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER user_stats_delete AFTER DELETE ON user_ratings
+BEGIN
+    UPDATE user_stats SET
+        watched = watched - (IFNULL(OLD.rank, '') IN ('WATCHED', 'WATCHING', 'ABSOLUTE CINEMA', 'GREAT', 'GOOD', 'COULD BE BETTER', 'BAD')),
+        absolute_cinema = absolute_cinema - (IFNULL(OLD.rank, '') = 'ABSOLUTE CINEMA'),
+        great = great - (IFNULL(OLD.rank, '') = 'GREAT'),
+        good = good - (IFNULL(OLD.rank, '') = 'GOOD'),
+        could_be_better = could_be_better - (IFNULL(OLD.rank, '') = 'COULD BE BETTER'),
+        bad = bad - (IFNULL(OLD.rank, '') = 'BAD'),
+        watching = watching - (IFNULL(OLD.rank, '') = 'WATCHING'),
+        watchlist = watchlist - (IFNULL(OLD.rank, '') = 'WATCHLIST')
+    WHERE user_id = OLD.user_id;
+END;
+
+CREATE TRIGGER user_stats_update AFTER UPDATE OF rank, user_id ON user_ratings
+BEGIN
+    UPDATE user_stats SET
+        watched = watched - (IFNULL(OLD.rank, '') IN ('WATCHED', 'WATCHING', 'ABSOLUTE CINEMA', 'GREAT', 'GOOD', 'COULD BE BETTER', 'BAD')),
+        absolute_cinema = absolute_cinema - (IFNULL(OLD.rank, '') = 'ABSOLUTE CINEMA'),
+        great = great - (IFNULL(OLD.rank, '') = 'GREAT'),
+        good = good - (IFNULL(OLD.rank, '') = 'GOOD'),
+        could_be_better = could_be_better - (IFNULL(OLD.rank, '') = 'COULD BE BETTER'),
+        bad = bad - (IFNULL(OLD.rank, '') = 'BAD'),
+        watching = watching - (IFNULL(OLD.rank, '') = 'WATCHING'),
+        watchlist = watchlist - (IFNULL(OLD.rank, '') = 'WATCHLIST')
+    WHERE user_id = OLD.user_id;
+    INSERT INTO user_stats (user_id)
+        SELECT NEW.user_id WHERE NOT EXISTS (SELECT 1 FROM user_stats WHERE user_id = NEW.user_id);
+    UPDATE user_stats SET
+        watched = watched + (IFNULL(NEW.rank, '') IN ('WATCHED', 'WATCHING', 'ABSOLUTE CINEMA', 'GREAT', 'GOOD', 'COULD BE BETTER', 'BAD')),
+        absolute_cinema = absolute_cinema + (IFNULL(NEW.rank, '') = 'ABSOLUTE CINEMA'),
+        great = great + (IFNULL(NEW.rank, '') = 'GREAT'),
+        good = good + (IFNULL(NEW.rank, '') = 'GOOD'),
+        could_be_better = could_be_better + (IFNULL(NEW.rank, '') = 'COULD BE BETTER'),
+        bad = bad + (IFNULL(NEW.rank, '') = 'BAD'),
+        watching = watching + (IFNULL(NEW.rank, '') = 'WATCHING'),
+        watchlist = watchlist + (IFNULL(NEW.rank, '') = 'WATCHLIST')
+    WHERE user_id = NEW.user_id;
+END;
@@ -0,0 +1,69 @@
+# status_index.py
+"""
+Per-user rating status index.
+Keeps an in-process map of (media_type, tmdb_id) -> rank for recently
+active users, so carousel and search overlays cost a dict lookup instead
+of scanning the user's whole library. Each entry is tagged with the
+user's ratings_version; rating-write routes bump that counter, and a
+stale entry is rebuilt on its next use (also across gunicorn workers).
+"""
+import os
+import threading
+from collections import OrderedDict
+from metrics import record_cache
+
+# Number of users whose index is kept in memory per worker
+STATUS_INDEX_SIZE = int(os.getenv("STATUS_INDEX_SIZE", 1000))
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+def index_key(media_type, tmdb_id):
+    """
+    Build the index key for a title; "tv" is stored as "show".
+    """
+    return ("show" if media_type in ("tv", "show") else "movie", int(tmdb_id))
+
+def bump_ratings_version(db, user_id):
+    """
+    Mark the user's ratings as changed. Call from every route that
+    writes user_ratings, inside the same transaction. Does not commit.
+    """
+    db.execute("UPDATE users SET ratings_version = ratings_version + 1 WHERE id = ?", (user_id,))
+
+def get_ratings_version(db, user_id):
+    """
+    Return the user's current ratings version (0 if the user is unknown).
+    """
+    row = db.execute("SELECT ratings_version FROM users WHERE id = ?", (user_id,)).fetchone()
+    return row["ratings_version"] if row else 0
+
+def get_status_index(db, user_id):
+    """
+    Return the user's {(media_type, tmdb_id): rank} index, rebuilding it
+    only when the stored ratings_version has changed.
+    """
+    version = get_ratings_version(db, user_id)
+
+    with _lock:
+        cached = _indexes.get(user_id)
+        hit = bool(cached and cached[0] == version)
+        if hit:
+            _indexes.move_to_end(user_id)
+    record_cache("status_index", hit)
+    if hit:
+        return cached[1]
+
+    rows = db.execute("""
+        SELECT tmdb_id, media_type, rank
+        FROM user_ratings
+        WHERE user_id = ?
+    """, (user_id,)).fetchall()
+    index = {index_key(row["media_type"], row["tmdb_id"]): row["rank"] for row in rows}
+
+    with _lock:
+        _indexes[user_id] = (version, index)
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > STATUS_INDEX_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,77 @@
+# tests/test_rank.py
+"""
+Rank routes against a throwaway database, with TMDb lookups replaced by
+canned title data. Run from the repository root:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="2watch-test-")
+os.environ.update({
+    "DATABASE_PATH": os.path.join(WORK_DIR, "database.db"),
+    "TMDB_CACHE_PATH": os.path.join(WORK_DIR, "cache.db"),
+    "IMAGE_CACHE_DIR": os.path.join(WORK_DIR, "image_cache"),
+    "ASSET_BUILD_DIR": os.path.join(WORK_DIR, "asset_build"),
+    # Nothing listens here, so any real TMDb call fails fast
+    "TMDB_BASE_URL": "http://127.0.0.1:9/3",
+    "SECRET_KEY": "test",
+    "TMDB_API_KEY": "test",
+    "YOUTUBE_API_KEY": "test",
+})
+sys.path.insert(0, ROOT_DIR)
+
+import catalog
+import migrations
+from app import app
+
+
+def fake_titles_data(pairs, deadline=None):
+    """
+    Stand-in for tmdb.get_titles_data: a minimal TMDb payload per title.
+    """
+    return [
+        {"id": tmdb_id, "name": f"Show {tmdb_id}", "first_air_date": "2020-01-01", "number_of_seasons": 2}
+        if media_type == "show" else
+        {"id": tmdb_id, "title": f"Movie {tmdb_id}", "release_date": "2020-01-01", "runtime": 100}
+        for tmdb_id, media_type in pairs
+    ]
+
+
+class RankTitleTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        conn = sqlite3.connect(os.environ["DATABASE_PATH"])
+        migrations.migrate(conn, log=lambda message: None)
+        conn.close()
+        cls._get_titles_data = catalog.get_titles_data
+        catalog.get_titles_data = fake_titles_data
+
+    @classmethod
+    def tearDownClass(cls):
+        catalog.get_titles_data = cls._get_titles_data
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.client = app.test_client()
+        self.client.post("/register", data={"username": "ranker", "password": "pw", "confirmation": "pw"})
+        response = self.client.post("/login", data={"username": "ranker", "password": "pw"})
+        self.assertEqual(response.status_code, 302)
+
+    def test_tv_title_ranked_from_watchlist_keeps_media_type(self):
+        response = self.client.post("/title/1399/rank", data={"rank": "GREAT", "media_type": "tv"})
+        self.assertEqual(response.status_code, 200)
+
+        data = self.client.get("/api/rank/tier?rank=GREAT").get_json()
+        self.assertEqual(
+            [(title["id"], title["name"], title["media_type"]) for title in data["titles"]],
+            [(1399, "Show 1399", "show")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,115 +1,460 @@
-# tmdb.py
-"""
-TMDb API integration helper module.
-Provides search, details lookup, and episode listing functions.
-"""
-import requests
-import os
-from dotenv import load_dotenv
-
-# Load API key from environment
-load_dotenv()
-
-API_KEY = os.getenv("TMDB_API_KEY")
-# Base URLs for API endpoints and images
-BASE_URL = "https://api.themoviedb.org/3"
-IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
-
-def search_title(query):
-    """
-    Search TMDb for movies or TV shows matching the query string.
-    Returns a list of dicts: id, media_type, name, poster_url, year.
-    """
-    params = {
-        "api_key": API_KEY,
-        "query": query
-    }
-
-    response = requests.get(f"{BASE_URL}/search/multi", params=params)
-
-    results = []
-
-    if response.status_code == 200:
-        for item in response.json().get("results", []):
-            # Skip types other than movie or TV
-            if item["media_type"] not in ["movie", "tv"]:
-                continue
-            results.append({
-                "id": item["id"],
-                "media_type": item["media_type"],
-                "name": item.get("title") or item.get("name"),
-                "poster_url": f"{IMAGE_BASE_URL}{item.get('poster_path')}" if item.get("poster_path") else "/static/images/placeholder.png",
-                # Extract year from release_date or first_air_date
-                "year": (
-                    item.get("release_date") or item.get("first_air_date") or "N/A"
-                )[:4]
-            })
-
-    return results
-
-def get_title_details(tmdb_id, media_type):
-    """
-    Fetch detailed information for a single title by TMDb ID and type.
-    Returns a dict with fields: id, name, description, year, duration,
-    genre, type (movie/show), poster_url, backdrop_url, media_type.
-    """
-    url = f"{BASE_URL}/{media_type}/{tmdb_id}"
-    params = {
-        "api_key": API_KEY,
-        "language": "en-US"
-    }
-
-    response = requests.get(url, params=params)
-    if response.status_code != 200:
-        return None
-
-    data = response.json()
-
-    # Build readable details object
-    return {
-        "id": tmdb_id,
-        "name": data.get("title") or data.get("name"),
-        "description": data.get("overview"),
-        "year": (data.get("release_date") or data.get("first_air_date") or "")[:4],
-        "duration": data.get("runtime") or (f"{len(data.get('seasons', []))} seasons" if media_type == "tv" else "N/A"),
-        "genre": ", ".join([genre["name"] for genre in data.get("genres", [])]),
-        "type": "movie" if media_type == "movie" else "show",
-        "poster_url": f"https://image.tmdb.org/t/p/w500{data.get('poster_path')}" if data.get("poster_path") else "/static/images/placeholder.png",
-        "backdrop_url": f"https://image.tmdb.org/t/p/original{data.get('backdrop_path')}" if data.get("backdrop_path") else None,
-        "media_type": media_type
-    }
-
-def get_episodes_for_tv_show(tmdb_id):
-    """
-    Retrieve the list of all episodes for a given TV show by TMDb ID.
-    Returns a list of dicts: season, episode, name.
-    """
-    # First fetch show details to know total seasons
-    details_url = f"{BASE_URL}/tv/{tmdb_id}"
-    params = {"api_key": API_KEY, "language": "en-US"}
-    details_response = requests.get(details_url, params=params)
-
-    if details_response.status_code != 200:
-        return []
-
-    data = details_response.json()
-    total_seasons = data.get("number_of_seasons", 1)
-    all_episodes = []
-
-    # Iterate through each season to fetch episodes
-    for season_number in range(1, total_seasons + 1):
-        season_url = f"{BASE_URL}/tv/{tmdb_id}/season/{season_number}"
-        season_response = requests.get(season_url, params=params)
-
-        if season_response.status_code != 200:
-            continue
-
-        season_data = season_response.json()
-        for ep in season_data.get("episodes", []):
-            all_episodes.append({
-                "season": season_number,
-                "episode": ep["episode_number"],
-                "name": ep["name"]
-            })
-
-    return all_episodes
+# tmdb.py
+"""
+TMDb API integration helper module.
+Provides search, details lookup, and episode listing functions.
+Title lookups go through a persistent cache shared by all routes, and
+batches of titles are resolved concurrently on a bounded worker pool.
+All HTTP traffic to TMDb goes through the shared TMDbClient instance.
+Cached responses are served stale-while-revalidate (see refresher.py).
+"""
+import requests
+import os
+import random
+import contextvars
+import threading
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from cache import SQLiteCache
+from images import image_url
+from metrics import upstream_timer
+from refresher import Gone, refresher, get_or_refresh
+
+# Load API key from environment
+load_dotenv()
+
+API_KEY = os.getenv("TMDB_API_KEY")
+# Base URL for API endpoints (images go through images.py); bench/ points it at a local stub
+BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+
+# HTTP client settings
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", 3.05))
+TMDB_READ_TIMEOUT = float(os.getenv("TMDB_READ_TIMEOUT", 10))
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", 2))
+TMDB_POOL_SIZE = int(os.getenv("TMDB_POOL_SIZE", 16))
+# Requests per second allowed per worker process, and the burst size
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", 20))
+TMDB_RATE_BURST = int(os.getenv("TMDB_RATE_BURST", 40))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    acquire() blocks until a token is available; pause() stops handing
+    out tokens for a number of seconds (used for 429 Retry-After).
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait_for)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class TMDbClient:
+    """
+    Shared HTTP client for the TMDb API.
+    Reuses keep-alive connections from a pool, applies connect and read
+    timeouts, retries 5xx responses and connection errors with jittered
+    exponential backoff, and rate limits requests with a token bucket
+    that honors the Retry-After header of 429 responses.
+    """
+    def __init__(self, api_key=API_KEY, base_url=BASE_URL,
+                 timeout=(TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT),
+                 max_retries=TMDB_MAX_RETRIES, pool_size=TMDB_POOL_SIZE,
+                 rate=TMDB_RATE_LIMIT, burst=TMDB_RATE_BURST):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, path, params=None):
+        """
+        Send a GET request for path (relative to base_url, e.g. "/movie/1")
+        and return the final requests.Response. Raises requests exceptions
+        if the connection still fails after all retries.
+        """
+        url = f"{self.base_url}{path}"
+        params = {"api_key": self.api_key, **(params or {})}
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            self.bucket.acquire()
+            try:
+                with upstream_timer("tmdb"):
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                self._backoff(attempt)
+                continue
+
+            if response.status_code == 429 and not last_attempt:
+                # Stop every thread in this worker until TMDb lets us back in
+                self.bucket.pause(self._retry_after(response, attempt))
+                continue
+            if response.status_code >= 500 and not last_attempt:
+                self._backoff(attempt)
+                continue
+            return response
+
+    def get_json(self, path, params=None):
+        """
+        GET path and return the decoded JSON body, or None on a non-200 response.
+        """
+        response = self.get(path, params)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def _backoff(self, attempt):
+        # Full jitter: sleep a random time up to 0.5s, 1s, 2s, ...
+        time.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    def _retry_after(self, response, attempt):
+        value = response.headers.get("Retry-After")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+        return 0.5 * 2 ** attempt + random.uniform(0, 0.5)
+
+# Shared client used by this module and by the routes in app.py
+tmdb_client = TMDbClient()
+
+def request_key(path, params=None):
+    """
+    Build the cache key for a GET request: the path plus sorted params.
+    """
+    return path + ("?" + urlencode(sorted(params.items())) if params else "")
+
+def _get_json_or_gone(path, params=None):
+    """
+    Like tmdb_client.get_json, but raise Gone on a 404 so cached copies of
+    removed titles are dropped instead of refreshed forever.
+    """
+    response = tmdb_client.get(path, params)
+    if response.status_code == 404:
+        raise Gone(path)
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+def _load_key(key):
+    """
+    Re-issue the GET request a cache key was built from.
+    """
+    path, _, query = key.partition("?")
+    return _get_json_or_gone(path, params=dict(parse_qsl(query)))
+
+def cached_get_json(cache, path, params=None, ttl=None):
+    """
+    GET path through cache and return the JSON body (None on failure).
+    Expired entries are returned immediately and refreshed in the background.
+    """
+    key = request_key(path, params)
+    return get_or_refresh(cache, key, lambda: _load_key(key), ttl)
+
+# Cache for raw /movie/{id} and /tv/{id} responses
+TITLE_CACHE_TTL = int(os.getenv("TMDB_TITLE_CACHE_TTL", 24 * 60 * 60))
+title_cache = SQLiteCache(table="title_cache", default_ttl=TITLE_CACHE_TTL)
+# Cache for global lists (popular, now playing, ...) shared by all users
+LIST_CACHE_TTL = int(os.getenv("TMDB_LIST_CACHE_TTL", 30 * 60))
+list_cache = SQLiteCache(table="list_cache", max_entries=2000, default_ttl=LIST_CACHE_TTL)
+# Cache for /search/multi responses, keyed by normalized query
+SEARCH_CACHE_TTL = int(os.getenv("TMDB_SEARCH_CACHE_TTL", 6 * 60 * 60))
+SEARCH_CACHE_SIZE = int(os.getenv("TMDB_SEARCH_CACHE_SIZE", 5000))
+search_cache = SQLiteCache(table="search_cache", max_entries=SEARCH_CACHE_SIZE, default_ttl=SEARCH_CACHE_TTL)
+# Cache for season payloads, one entry per season; finished seasons rarely change
+SEASON_CACHE_TTL = int(os.getenv("TMDB_SEASON_CACHE_TTL", 6 * 60 * 60))
+FINISHED_SEASON_CACHE_TTL = int(os.getenv("TMDB_FINISHED_SEASON_CACHE_TTL", 30 * 24 * 60 * 60))
+season_cache = SQLiteCache(table="season_cache", default_ttl=SEASON_CACHE_TTL)
+# TMDb accepts at most 20 items in append_to_response
+SEASONS_PER_REQUEST = 20
+
+# Shared worker pool for batched lookups and the per-batch deadline (seconds)
+TMDB_MAX_WORKERS = int(os.getenv("TMDB_MAX_WORKERS", 8))
+TMDB_BATCH_DEADLINE = float(os.getenv("TMDB_BATCH_DEADLINE", 8))
+_executor = ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS, thread_name_prefix="tmdb")
+
+# Cached TMDb responses can be refreshed by re-issuing their request
+refresher.register(title_cache, _load_key)
+refresher.register(list_cache, _load_key)
+refresher.register(search_cache, _load_key)
+
+def normalize_query(query):
+    """
+    Case-fold and collapse whitespace so equivalent queries share a cache entry.
+    """
+    return " ".join(query.casefold().split())
+
+def search_title(query):
+    """
+    Search TMDb for movies or TV shows matching the query string.
+    Returns a list of dicts: id, media_type, name, poster_url, year.
+    Responses are cached by normalized query in search_cache.
+    """
+    query = normalize_query(query)
+    if not query:
+        return []
+
+    params = {
+        "query": query
+    }
+
+    data = cached_get_json(search_cache, "/search/multi", params=params)
+
+    results = []
+
+    if data is not None:
+        for item in data.get("results", []):
+            # Skip types other than movie or TV
+            if item["media_type"] not in ["movie", "tv"]:
+                continue
+            results.append({
+                "id": item["id"],
+                "media_type": item["media_type"],
+                "name": item.get("title") or item.get("name"),
+                "poster_url": image_url(item.get("poster_path"), "poster", placeholder=True),
+                # Extract year from release_date or first_air_date
+                "year": (
+                    item.get("release_date") or item.get("first_air_date") or "N/A"
+                )[:4]
+            })
+
+    return results
+
+def get_title_data(tmdb_id, media_type):
+    """
+    Return the raw TMDb details JSON for a title, or None if not found.
+    media_type may be "movie", "tv" or "show". Responses are served from
+    title_cache when available, so every details lookup shares one cache.
+    """
+    media_type = "tv" if media_type in ("tv", "show") else "movie"
+    return cached_get_json(title_cache, f"/{media_type}/{tmdb_id}", params={"language": "en-US"})
+
+def format_title_details(tmdb_id, media_type, data):
+    """
+    Build a title details dict from raw TMDb JSON. Fields: id, name,
+    description, year, duration, genre, type (movie/show), poster_url,
+    backdrop_url, poster_path, media_type.
+    """
+    return {
+        "id": tmdb_id,
+        "name": data.get("title") or data.get("name"),
+        "description": data.get("overview"),
+        "year": (data.get("release_date") or data.get("first_air_date") or "")[:4],
+        "duration": data.get("runtime") or (f"{len(data.get('seasons', []))} seasons" if media_type == "tv" else "N/A"),
+        "genre": ", ".join([genre["name"] for genre in data.get("genres", [])]),
+        "type": "movie" if media_type == "movie" else "show",
+        "poster_url": image_url(data.get("poster_path"), "poster", placeholder=True),
+        "backdrop_url": image_url(data.get("backdrop_path"), "backdrop"),
+        "poster_path": data.get("poster_path"),
+        "media_type": media_type
+    }
+
+def placeholder_details(tmdb_id, media_type):
+    """
+    Return a details dict with the same fields as format_title_details,
+    used when a title could not be fetched in time.
+    """
+    return {
+        "id": tmdb_id,
+        "name": "Unknown",
+        "description": "",
+        "year": "",
+        "duration": "N/A",
+        "genre": "",
+        "type": "movie" if media_type == "movie" else "show",
+        "poster_url": "/static/images/placeholder.png",
+        "backdrop_url": None,
+        "poster_path": None,
+        "media_type": media_type,
+        "placeholder": True
+    }
+
+def fetch_all(calls, deadline=TMDB_BATCH_DEADLINE):
+    """
+    Run several zero-argument callables concurrently on the shared pool
+    and return their results in order (None for failures or timeouts).
+    Calls made from inside a pool thread run inline, so nested batches
+    can never wait on the pool they are occupying.
+    """
+    if threading.current_thread().name.startswith("tmdb"):
+        results = []
+        for call in calls:
+            try:
+                results.append(call())
+            except Exception:
+                results.append(None)
+        return results
+
+    # Each call runs in a copy of the caller's context, so its TMDb requests
+    # are counted against the caller's endpoint
+    futures = [_executor.submit(contextvars.copy_context().run, call) for call in calls]
+    done, not_done = wait(futures, timeout=deadline)
+    for future in not_done:
+        future.cancel()
+    return [
+        future.result() if future in done and future.exception() is None else None
+        for future in futures
+    ]
+
+def get_titles_data(pairs, deadline=TMDB_BATCH_DEADLINE):
+    """
+    Fetch raw TMDb JSON for a list of (tmdb_id, media_type) pairs concurrently.
+    Returns a list in the same order as pairs. Entries that fail or are
+    not ready when the deadline expires are None.
+    """
+    return fetch_all(
+        [lambda tmdb_id=tmdb_id, media_type=media_type: get_title_data(tmdb_id, media_type)
+         for tmdb_id, media_type in pairs],
+        deadline
+    )
+
+def _fetch_seasons(tmdb_id, season_numbers):
+    """
+    Fetch several seasons of a show in one request using append_to_response.
+    Returns a dict mapping season number to the season JSON.
+    """
+    params = {
+        "language": "en-US",
+        "append_to_response": ",".join(f"season/{n}" for n in season_numbers)
+    }
+    data = tmdb_client.get_json(f"/tv/{tmdb_id}", params=params) or {}
+    return {n: data[f"season/{n}"] for n in season_numbers if data.get(f"season/{n}")}
+
+def season_payload(season_number, data, show):
+    """
+    Build the cached season payload from raw season JSON and the show's
+    details: season, name, finished, episodes (episode, name, air_date).
+    A season is finished when all its episodes have aired and either a
+    later season exists or the show has ended.
+    """
+    episodes = [
+        {"episode": ep["episode_number"], "name": ep.get("name") or "", "air_date": ep.get("air_date")}
+        for ep in data.get("episodes", [])
+    ]
+    today = date.today().isoformat()
+    aired = bool(episodes) and all(ep["air_date"] and ep["air_date"] <= today for ep in episodes)
+    later_season = season_number < (show.get("number_of_seasons") or 0)
+    ended = show.get("status") in ("Ended", "Canceled")
+    return {
+        "season": season_number,
+        "name": data.get("name") or f"Season {season_number}",
+        "finished": aired and (later_season or ended),
+        "episodes": episodes
+    }
+
+def season_ttl(payload):
+    """
+    Cache finished seasons much longer than airing ones.
+    """
+    return FINISHED_SEASON_CACHE_TTL if payload["finished"] else SEASON_CACHE_TTL
+
+def _season_key(tmdb_id, season_number):
+    return f"tv:{int(tmdb_id)}:season:{int(season_number)}"
+
+def _load_season(key):
+    """
+    Fetch one season for a season_cache key and build its payload.
+    """
+    _, tmdb_id, _, season_number = key.split(":")
+    data = _get_json_or_gone(f"/tv/{tmdb_id}/season/{season_number}", params={"language": "en-US"})
+    if data is None:
+        return None
+    show = get_title_data(tmdb_id, "tv") or {}
+    return season_payload(int(season_number), data, show)
+
+# Refreshed seasons keep the TTL that matches their new payload
+refresher.register(season_cache, _load_season, season_ttl)
+
+def get_season(tmdb_id, season_number):
+    """
+    Return the payload for one season of a show (see season_payload), or
+    None if TMDb does not have it. Cached per season, stale-while-revalidate.
+    """
+    key = _season_key(tmdb_id, season_number)
+    return get_or_refresh(season_cache, key, lambda: _load_season(key), season_ttl)
+
+def get_seasons(tmdb_id, season_numbers):
+    """
+    Return {season_number: payload} for several seasons of a show.
+    Cached seasons are used as they are; the missing ones are fetched in
+    parallel batches of SEASONS_PER_REQUEST and cached one by one.
+    """
+    seasons = {}
+    missing = []
+    for season_number in season_numbers:
+        key = _season_key(tmdb_id, season_number)
+        value, stale = season_cache.get_entry(key)
+        if value is None:
+            missing.append(season_number)
+            continue
+        if stale:
+            refresher.queue(season_cache, key)
+        seasons[season_number] = value
+
+    if missing:
+        # Show details are shared with get_title_data through title_cache
+        show = get_title_data(tmdb_id, "tv") or {}
+        chunks = [missing[i:i + SEASONS_PER_REQUEST] for i in range(0, len(missing), SEASONS_PER_REQUEST)]
+        for chunk_seasons in fetch_all([lambda chunk=chunk: _fetch_seasons(tmdb_id, chunk) for chunk in chunks]):
+            for season_number, data in (chunk_seasons or {}).items():
+                payload = season_payload(season_number, data, show)
+                season_cache.set(_season_key(tmdb_id, season_number), payload, season_ttl(payload))
+                seasons[season_number] = payload
+    return seasons
+
+def get_episodes_for_tv_show(tmdb_id, season_numbers=None):
+    """
+    Retrieve the list of episodes for a given TV show by TMDb ID, for all
+    regular seasons or only the given ones.
+    Returns a list of dicts: season, episode, name.
+    """
+    if season_numbers is None:
+        data = get_title_data(tmdb_id, "tv")
+        if data is None:
+            return []
+        season_numbers = range(1, data.get("number_of_seasons", 1) + 1)
+
+    seasons = get_seasons(tmdb_id, list(season_numbers))
+    all_episodes = []
+    for season_number in sorted(seasons):
+        for ep in seasons[season_number]["episodes"]:
+            all_episodes.append({
+                "season": season_number,
+                "episode": ep["episode"],
+                "name": ep["name"]
+            })
+    return all_episodes
@@ -0,0 +1,50 @@
+# user_cache.py
+"""
+In-process cache of logged-in users for the Flask-Login user loader.
+Keeps recently seen User objects for a short TTL so authenticated
+requests (including every XHR) skip the users lookup. Routes that change
+a user's row call invalidate_user; other workers catch up within the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from metrics import record_cache
+
+# Number of users kept per worker and seconds before an entry is re-read
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+def get_cached_user(user_id):
+    """
+    Return the cached user for user_id, or None if missing or expired.
+    """
+    with _lock:
+        cached = _users.get(user_id)
+        if cached is not None and cached[0] <= time.monotonic():
+            del _users[user_id]
+            cached = None
+        if cached is not None:
+            _users.move_to_end(user_id)
+    record_cache("users", cached is not None)
+    return cached[1] if cached is not None else None
+
+def cache_user(user):
+    """
+    Store user (anything with an id) for USER_CACHE_TTL seconds.
+    """
+    with _lock:
+        _users[user.id] = (time.monotonic() + USER_CACHE_TTL, user)
+        _users.move_to_end(user.id)
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+
+def invalidate_user(user_id):
+    """
+    Drop the cached user after their row changed or was deleted.
+    """
+    with _lock:
+        _users.pop(user_id, None)
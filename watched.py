@@ -0,0 +1,117 @@
+# watched.py
+"""
+Watched-episode bitmaps.
+Each (user, show, season) has one row in user_season_watched whose bits
+blob has bit n - 1 set when episode n is watched (little-endian bytes).
+In Python a season is an int mask, so marking, clearing, progress counts
+and finding the next unwatched episode are bit operations.
+"""
+
+def mask_to_blob(mask):
+    """
+    Encode an int mask as a little-endian blob (empty for no bits).
+    """
+    return mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+
+def blob_to_mask(blob):
+    """
+    Decode a bits blob back into an int mask.
+    """
+    return int.from_bytes(blob or b"", "little")
+
+def episode_bit(episode):
+    """
+    Mask with only the bit for this episode number (episodes start at 1).
+    Raises ValueError for numbers below 1.
+    """
+    episode = int(episode)
+    if episode < 1:
+        raise ValueError("episode numbers start at 1")
+    return 1 << (episode - 1)
+
+def mask_episodes(mask):
+    """
+    Episode numbers whose bits are set, in ascending order.
+    """
+    episodes = []
+    while mask:
+        low = mask & -mask
+        episodes.append(low.bit_length())
+        mask ^= low
+    return episodes
+
+def season_masks(episodes):
+    """
+    Build {season: mask of all its episodes} from an episode list
+    (dicts with season and episode, as returned by tmdb).
+    """
+    masks = {}
+    for ep in episodes:
+        masks[ep["season"]] = masks.get(ep["season"], 0) | episode_bit(ep["episode"])
+    return masks
+
+def get_watched(db, user_id, tmdb_id, seasons=None):
+    """
+    Return {season: mask} of watched episodes for one show, optionally
+    limited to the given seasons.
+    """
+    sql = "SELECT season, bits FROM user_season_watched WHERE user_id = ? AND tmdb_id = ?"
+    params = [user_id, tmdb_id]
+    if seasons is not None:
+        seasons = list(seasons)
+        if not seasons:
+            return {}
+        sql += f" AND season IN ({', '.join('?' for _ in seasons)})"
+        params += seasons
+    return {row["season"]: blob_to_mask(row["bits"]) for row in db.execute(sql, params)}
+
+def apply_masks(db, user_id, tmdb_id, changes):
+    """
+    Apply (season, mask, watched) changes in order: watched sets the mask's
+    bits, otherwise they are cleared. Writes every touched season with one
+    executemany UPSERT. Does not commit.
+    Returns the new {season: mask} for the touched seasons.
+    """
+    masks = get_watched(db, user_id, tmdb_id, {season for season, _, _ in changes})
+    for season, mask, watched in changes:
+        current = masks.get(season, 0)
+        masks[season] = current | mask if watched else current & ~mask
+
+    db.executemany("""
+        INSERT INTO user_season_watched (user_id, tmdb_id, season, bits)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(user_id, tmdb_id, season)
+        DO UPDATE SET bits = excluded.bits
+    """, [(user_id, tmdb_id, season, mask_to_blob(mask)) for season, mask in masks.items()])
+    return masks
+
+def toggle_watched(db, user_id, tmdb_id, season, episode):
+    """
+    Flip one episode's watched bit. Does not commit.
+    Returns True if the episode is now watched.
+    """
+    bit = episode_bit(episode)
+    watched = not get_watched(db, user_id, tmdb_id, [season]).get(season, 0) & bit
+    apply_masks(db, user_id, tmdb_id, [(season, bit, watched)])
+    return watched
+
+def progress(watched, all_masks):
+    """
+    Count watched and total episodes: (watched_count, total_count).
+    watched and all_masks are {season: mask}; bits for episodes that no
+    longer exist on TMDb are ignored.
+    """
+    total = sum(mask.bit_count() for mask in all_masks.values())
+    done = sum((watched.get(season, 0) & mask).bit_count() for season, mask in all_masks.items())
+    return done, total
+
+def next_unwatched(watched, all_masks):
+    """
+    Return (season, episode) of the first unwatched episode after season 0,
+    or None if everything is watched.
+    """
+    for season in sorted(s for s in all_masks if s > 0):
+        remaining = all_masks[season] & ~watched.get(season, 0)
+        if remaining:
+            return season, (remaining & -remaining).bit_length()
+    return None
@@ -0,0 +1,147 @@
+# youtube.py
+"""
+YouTube Data API helper module.
+Keeps the Finder playlist in memory so /api/random_video can pick videos
+with an O(1) random index. The playlist is refreshed in the background on
+a schedule, revalidating with the ETag of the first page.
+"""
+import os
+import random
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+from metrics import upstream_timer
+
+# Load API key from environment
+load_dotenv()
+
+YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3")
+PLAYLIST_ID = "PL86SiVwkw_oeDQoAZwcuyoyG43eKWtbJM"
+# Maximum number of playlist items kept in memory
+PLAYLIST_LIMIT = 200
+# Seconds between playlist revalidations
+PLAYLIST_REFRESH_INTERVAL = int(os.getenv("YOUTUBE_PLAYLIST_REFRESH", 6 * 60 * 60))
+
+
+class PlaylistCache:
+    """
+    In-process copy of a YouTube playlist.
+    videos is a list of dicts: videoId, title, description.
+    """
+    def __init__(self, playlist_id=PLAYLIST_ID, refresh_interval=PLAYLIST_REFRESH_INTERVAL):
+        self.playlist_id = playlist_id
+        self.refresh_interval = refresh_interval
+        self.videos = []
+        self.etag = None
+        self.fetched_at = 0.0
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _get_page(self, page_token=None, etag=None):
+        params = {
+            "part": "snippet",
+            "playlistId": self.playlist_id,
+            "maxResults": 50,
+            "key": YOUTUBE_API_KEY
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        headers = {"If-None-Match": etag} if etag else {}
+        with upstream_timer("youtube"):
+            return self.session.get(f"{YOUTUBE_API_URL}/playlistItems", params=params, headers=headers, timeout=10)
+
+    def refresh(self):
+        """
+        Re-download the playlist (up to PLAYLIST_LIMIT items). If the
+        first page is unchanged (304 for our ETag) the current list is kept.
+        """
+        try:
+            response = self._get_page(etag=self.etag if self.videos else None)
+            if response.status_code == 304:
+                self.fetched_at = time.time()
+                return
+            if response.status_code != 200:
+                return
+
+            data = response.json()
+            etag = data.get("etag")
+            items = data.get("items", [])
+            next_page_token = data.get("nextPageToken")
+
+            while next_page_token and len(items) < PLAYLIST_LIMIT:
+                page = self._get_page(next_page_token)
+                if page.status_code != 200:
+                    break
+                page_data = page.json()
+                items.extend(page_data.get("items", []))
+                next_page_token = page_data.get("nextPageToken")
+
+            videos = []
+            for item in items[:PLAYLIST_LIMIT]:
+                snippet = item.get("snippet", {})
+                video_id = snippet.get("resourceId", {}).get("videoId")
+                if video_id:
+                    videos.append({
+                        "videoId": video_id,
+                        "title": snippet.get("title", "Untitled"),
+                        "description": snippet.get("description", "")
+                    })
+
+            if videos:
+                self.videos = videos
+                self.etag = etag
+                self.fetched_at = time.time()
+        except requests.RequestException:
+            pass
+        finally:
+            self._refreshing = False
+
+    def get_videos(self):
+        """
+        Return the cached video list. The first call loads it; later calls
+        trigger a background refresh once refresh_interval has passed.
+        """
+        if not self.videos:
+            with self._lock:
+                if not self.videos:
+                    self.refresh()
+            return self.videos
+
+        if time.time() - self.fetched_at > self.refresh_interval and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self.refresh, name="playlist-refresh", daemon=True).start()
+        return self.videos
+
+    def pick(self, count=1, exclude=()):
+        """
+        Pick up to count distinct random videos, avoiding ids in exclude
+        when possible. Each pick is an O(1) random index into the list.
+        """
+        videos = self.videos
+        exclude = set(exclude)
+        if len(videos) - len(exclude) < count:
+            exclude = set()
+        count = min(count, len(videos))
+
+        picked, picked_ids = [], set()
+        attempts = 0
+        while len(picked) < count and attempts < count * 20:
+            attempts += 1
+            video = videos[random.randrange(len(videos))]
+            if video["videoId"] in exclude or video["videoId"] in picked_ids:
+                continue
+            picked.append(video)
+            picked_ids.add(video["videoId"])
+
+        # Mostly excluded list: fall back to choosing from what is left
+        if len(picked) < count:
+            remaining = [v for v in videos if v["videoId"] not in exclude and v["videoId"] not in picked_ids]
+            picked.extend(random.sample(remaining, min(count - len(picked), len(remaining))))
+        return picked
+
+
+# Shared playlist for the Finder page
+finder_playlist = PlaylistCache()